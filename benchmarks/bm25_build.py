@@ -0,0 +1,87 @@
+"""
+Peak memory and time of the streaming BM25 index build under different budgets.
+
+    python benchmarks/bm25_build.py --docs 200000 --budgets 16 64 256
+
+Documents are generated one at a time (like BM25Builder reading nodes), so the peak
+traced by tracemalloc is the writer's: the run buffer, then the merge. Every build is
+checked to produce the same arrays as the first one. The merge holds one term's
+postings whole, so a term found in most documents can add to the peak on top of the budget.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.store.bm25_index import BM25IndexWriter
+
+
+def iter_docs(docs, vocab, mean_len, seed):
+    """Zipf distributed terms, log-normal lengths, split into the BM25F fields."""
+    rng = np.random.default_rng(seed)
+    for i in range(docs):
+        length = int(np.clip(rng.lognormal(np.log(mean_len), 0.8), 1, 50 * mean_len))
+        tokens = [f"t{t}" for t in (rng.zipf(1.2, length) - 1) % vocab]
+        yield f"node{i}", {"id": tokens[:2], "signature": tokens[2:6], "docstring": [], "body": tokens[6:]}
+
+
+def build(path, args, budget):
+    with BM25IndexWriter(path, budget) as writer:
+        for node_id, fields in iter_docs(args.docs, args.vocab, args.mean_len, args.seed):
+            writer.add(node_id, fields)
+        runs = len(writer.runs) + 1
+        postings = writer.posting_count
+    return runs, postings
+
+
+def measure(path, args, budget):
+    """Peak traced memory of one build, then the time of an untraced one (tracemalloc is slow)."""
+    tracemalloc.start()
+    runs, postings = build(path, args, budget)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    build(path, args, budget)
+    return time.perf_counter() - start, peak, runs, postings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--mean-len", type=int, default=40)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[8, 32, 128], help="MB")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="bm25_build_")
+    try:
+        print(f"[Bench] => {args.docs} docs, vocabulary {args.vocab}")
+        print(f"\n  {'budget MB':>9} {'runs':>5} {'peak MB':>8} {'seconds':>8}")
+        reference = None
+        for budget in args.budgets:
+            index_path = os.path.join(path, f"index_{budget}")
+            elapsed, peak, runs, postings = measure(index_path, args, budget)
+            print(f"  {budget:>9} {runs:>5} {peak / 2**20:8.1f} {elapsed:8.1f}")
+
+            names = sorted(n for n in os.listdir(index_path) if n.endswith(".npy"))
+            if reference is None:
+                reference = index_path
+                continue
+            for name in names:
+                if not np.array_equal(np.load(os.path.join(reference, name)), np.load(os.path.join(index_path, name))):
+                    raise AssertionError(f"{name} differs between budgets")
+            shutil.rmtree(index_path)
+        print(f"\n[Bench] => {postings} postings, all budgets built the same index")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
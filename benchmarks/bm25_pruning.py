@@ -0,0 +1,103 @@
+"""
+Pruned BM25 top-k (MaxScore + block-max bounds) vs exhaustive scoring on a synthetic corpus.
+
+    python benchmarks/bm25_pruning.py --docs 200000 --queries 200
+
+Every query is checked: both paths must return the same documents in the same order.
+BM25Index.top_k only prunes from BM25_PRUNE_MIN_DOCS documents on, that threshold is
+where the pruned mean latency drops below the exhaustive one here.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")  # src.config builds the llm client at import
+from src.config import BM25F_WEIGHTS as WEIGHTS, BM25F_B as B, BM25F_K1 as K1  # the retriever's tuning
+from src.config import BM25_PRUNE_MIN_DOCS
+from src.store.bm25_index import write_bm25_index, BM25Index
+
+
+def make_corpus(docs, vocab, mean_len, seed):
+    """Zipf distributed terms, log-normal document lengths (a few huge bodies, many short ones)."""
+    rng = np.random.default_rng(seed)
+    lengths = np.clip(rng.lognormal(np.log(mean_len), 0.8, docs).astype(int), 1, 50 * mean_len)
+    tokens = (rng.zipf(1.2, lengths.sum()) - 1) % vocab
+    words = np.array([f"t{i}" for i in range(vocab)])[tokens]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    #BM25F fields: a short name and signature, a docstring half the time, the rest is body
+    corpus = []
+    for i in range(docs):
+        tokens = words[bounds[i]:bounds[i + 1]].tolist()
+        docstring = tokens[6:16] if i % 2 else []
+        corpus.append({"id": tokens[:2], "signature": tokens[2:6], "docstring": docstring, "body": tokens[6 + len(docstring):]})
+    return corpus
+
+
+def make_queries(count, vocab, seed):
+    """2-4 terms each: mostly mid-frequency names plus sometimes a very common one."""
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for _ in range(count):
+        terms = [f"t{i}" for i in rng.integers(20, min(vocab, 5000), rng.integers(2, 5))]
+        if rng.random() < 0.3:
+            terms.append(f"t{rng.integers(0, 20)}")
+        queries.append(terms)
+    return queries
+
+
+def timed(fn, queries, k):
+    results, times = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q, k, WEIGHTS, B, K1))
+        times.append(time.perf_counter() - start)
+    return results, np.array(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--mean-len", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10, help="retriever asks for limit*2 = 10")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="bm25_bench_")
+    try:
+        print(f"[Bench] => Building corpus of {args.docs} docs...")
+        start = time.perf_counter()
+        corpus = make_corpus(args.docs, args.vocab, args.mean_len, args.seed)
+        write_bm25_index(corpus, [f"node{i}" for i in range(args.docs)], os.path.join(path, "index"))
+        print(f"[Bench] => Index built in {time.perf_counter() - start:.1f}s ({sum(len(t) for doc in corpus for t in doc.values())} tokens)")
+        del corpus
+
+        index = BM25Index(os.path.join(path, "index"))
+        queries = make_queries(args.queries, args.vocab, args.seed)
+        index.top_k_pruned(queries[0], args.k, WEIGHTS, B, K1)  # warm the mapping
+
+        exhaustive, t_full = timed(index.top_k_exhaustive, queries, args.k)
+        pruned, t_pruned = timed(index.top_k_pruned, queries, args.k)
+
+        for q, (d1, s1), (d2, s2) in zip(queries, exhaustive, pruned):
+            if not (np.array_equal(d1, d2) and np.array_equal(s1, s2)):
+                raise AssertionError(f"pruned top-k differs for {q}")
+
+        print(f"[Bench] => {args.queries} queries, k={args.k}, results identical")
+        print(f"  exhaustive  mean {t_full.mean():8.3f} ms   p50 {np.median(t_full):8.3f} ms   p95 {np.percentile(t_full, 95):8.3f} ms")
+        print(f"  pruned      mean {t_pruned.mean():8.3f} ms   p50 {np.median(t_pruned):8.3f} ms   p95 {np.percentile(t_pruned, 95):8.3f} ms")
+        print(f"  speedup     {t_full.mean() / t_pruned.mean():.1f}x")
+        used = "pruned" if index.doc_count >= BM25_PRUNE_MIN_DOCS else "exhaustive"
+        print(f"  top_k uses  {used} at this size (BM25_PRUNE_MIN_DOCS={BM25_PRUNE_MIN_DOCS})")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
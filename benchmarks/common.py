@@ -0,0 +1,88 @@
+"""
+Helpers shared by the benchmark scripts. Import after the repo root is on sys.path.
+"""
+import os
+import ast
+import numpy as np
+
+from src.store.tokenizer import tokenize
+from src.store.vector_index import normalize_rows
+
+
+def make_corpus(docs, dim, topics, spread, queries, seed):
+    """Clustered rows like code chunk embeddings, queries are noisy corpus rows."""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.normal(size=(topics, dim)))
+    vectors = centers[rng.integers(0, topics, docs)] + rng.normal(scale=spread / np.sqrt(dim), size=(docs, dim))
+    picked = rng.integers(0, docs, queries)
+    query_vectors = vectors[picked] + rng.normal(scale=0.3 / np.sqrt(dim), size=(queries, dim))
+    return normalize_rows(vectors), normalize_rows(query_vectors)
+
+
+def collect_functions(root, max_files):
+    """
+    The first max_files .py files of the tree (tests and site-packages left out) and
+    every function in them: (node id, short name, owner class, source code, docstring).
+    """
+    files = []
+    for dirpath, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in {"tests", "test", "__pycache__", "site-packages"}]
+        files.extend(os.path.join(dirpath, n) for n in names if n.endswith(".py"))
+    files = sorted(files)[:max_files]
+
+    functions = []
+    for path in files:
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                source = f.read()
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            continue
+        lines = source.splitlines(keepends=True)
+        module = os.path.splitext(os.path.relpath(path, root))[0].replace(os.sep, ".")
+
+        def visit(node, owner):
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, ast.ClassDef):
+                    visit(child, child.name)
+                elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    node_id = f"{module}.{owner}.{child.name}" if owner else f"{module}.{child.name}"
+                    code = "".join(lines[child.lineno - 1:child.end_lineno])
+                    functions.append((node_id, child.name, owner, code, ast.get_docstring(child) or ""))
+        visit(tree, None)
+    return files, functions
+
+
+def query_forms(name, owner, docstring=""):
+    """
+    The ways a user might look a function up: its name as typed (as written,
+    Class.method, camelCase, plain words) and, given a docstring, its first line.
+    """
+    parts = [p for p in name.strip("_").split("_") if p]
+    forms = {"as written": name}
+    if owner:
+        forms["Class.method"] = f"{owner}.{name}"
+    if len(parts) > 1:
+        forms["camelCase"] = parts[0] + "".join(p.capitalize() for p in parts[1:])
+        forms["words"] = " ".join(parts)
+    summary = docstring.strip().splitlines()[0] if docstring.strip() else ""
+    if len(summary.split()) >= 4:
+        forms["docstring"] = summary
+    return forms
+
+
+def evaluate(index, queries, k, query_tokenizer=tokenize, params=None):
+    """hit@1, hit@k and the mean number of candidates the grader reads, over (target, text) queries."""
+    hits1 = hits10 = 0
+    reads = []
+    for target, text in queries:
+        ranked = index.search(query_tokenizer(text), k, **(params or {}))
+        if ranked and ranked[0] == target:
+            hits1 += 1
+        if target in ranked:
+            hits10 += 1
+            reads.append(ranked.index(target) + 1)
+        else:
+            reads.append(k)  # the grader reads all k and still misses
+    n = len(queries) or 1
+    return hits1 / n, hits10 / n, sum(reads) / n
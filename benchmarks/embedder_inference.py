@@ -0,0 +1,90 @@
+"""
+CPU inference modes of the embedder: float32 torch vs dynamic int8 vs ONNX Runtime.
+
+    python benchmarks/embedder_inference.py --root /path/to/python/project --modes torch torch-int8 onnx
+
+Function sources of the tree (the chunks VectorStoreBuilder embeds, capped at
+--max-chars) are embedded by every mode on CPU. Reported: load time (including the
+int8 conversion or the ONNX export on a first run), texts/s, and the cosine of every
+embedding with the float32 one (min / 1st percentile / mean). Validation at load can
+refuse a mode (EMBED_MIN_COSINE); it is disabled here so every mode is measured.
+"""
+import os
+import ast
+import sys
+import time
+import argparse
+import sysconfig
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")  # src.config builds the llm client at import
+os.environ["CUDA_VISIBLE_DEVICES"] = ""  # the modes are CPU modes
+from src.config import MODEL_NAME
+from src.model import EmbeddingModel, INFERENCE_MODES, cosine_agreement
+
+
+def collect_texts(root, count, max_chars):
+    texts = []
+    for dirpath, dirs, names in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d not in {"tests", "test", "__pycache__", "site-packages"})
+        for name in sorted(n for n in names if n.endswith(".py")):
+            try:
+                with open(os.path.join(dirpath, name), "r", encoding="utf-8", errors="ignore") as f:
+                    source = f.read()
+                tree = ast.parse(source)
+            except (SyntaxError, ValueError):
+                continue
+            lines = source.splitlines(keepends=True)
+            for node in ast.walk(tree):
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    texts.append("".join(lines[node.lineno - 1:node.end_lineno])[:max_chars])
+                    if len(texts) == count:
+                        return texts
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--root", default=sysconfig.get_paths()["stdlib"], help="python source tree (default: the stdlib)")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--max-chars", type=int, default=3000)
+    parser.add_argument("--modes", nargs="+", default=list(INFERENCE_MODES), choices=INFERENCE_MODES)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    texts = collect_texts(args.root, args.texts, args.max_chars)
+    print(f"[Bench] => {len(texts)} functions from {args.root}, {sum(map(len, texts)) / 1e3:.0f}k chars, {MODEL_NAME}")
+
+    modes = ["torch"] + [m for m in args.modes if m != "torch"]
+    baseline = None
+    rows = []
+    for mode in modes:
+        start = time.perf_counter()
+        model = EmbeddingModel(MODEL_NAME, args.batch_size, inference=mode, min_cosine=-1.0)
+        loaded = time.perf_counter() - start
+        if model.inference != mode:
+            rows.append((mode, loaded, None, None))
+            continue
+
+        model.embed_documents(texts[:args.batch_size])  # warm-up
+        start = time.perf_counter()
+        vectors = model.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = vectors
+        rows.append((mode, loaded, len(texts) / elapsed, cosine_agreement(baseline, vectors)))
+        del model
+
+    print(f"\n  {'mode':<11} {'load s':>7} {'texts/s':>8} {'speedup':>8} {'min cos':>8} {'p1 cos':>8} {'mean cos':>9}")
+    base_rate = rows[0][2]
+    for mode, loaded, rate, cosine in rows:
+        if rate is None:
+            print(f"  {mode:<11} {loaded:7.1f}  unavailable, see the log above")
+            continue
+        print(f"  {mode:<11} {loaded:7.1f} {rate:8.1f} {rate / base_rate:7.2f}x "
+              f"{cosine.min():8.4f} {np.percentile(cosine, 1):8.4f} {cosine.mean():9.4f}")
+
+
+if __name__ == "__main__":
+    main()
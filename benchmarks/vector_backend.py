@@ -0,0 +1,125 @@
+"""
+Local vector index (exact and IVF) vs Chroma on the same corpus.
+
+    python benchmarks/vector_backend.py --docs 100000 --dim 768 --nprobe 8 16 32
+
+Vectors are clustered like code chunk embeddings (many near-duplicates around topics);
+queries are corpus vectors with noise. Recall@k is measured against exact search,
+latency per single query (what the retriever does) and the throughput of the exact
+search batched over all queries. Chroma (HNSW, cosine) is queried through chromadb
+directly, so the langchain wrapper's own overhead is not counted; it is skipped when
+chromadb is not installed.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.store.vector_index import VectorIndex
+from benchmarks.common import make_corpus
+
+
+def exact_top_k(vectors, queries, k):
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & t) / len(t) for f, t in zip(found, truth)]))
+
+
+def latency(search, queries):
+    """Per-query seconds (p50, p95) and the results."""
+    times, found = [], []
+    for q in queries:
+        start = time.perf_counter()
+        found.append(search(q))
+        times.append(time.perf_counter() - start)
+    return np.percentile(times, 50), np.percentile(times, 95), found
+
+
+def build_local(path, vectors, ivf_min_rows, nprobe, batch=4096):
+    index = VectorIndex(path, ivf_min_rows, nprobe)
+    for start in range(0, len(vectors), batch):
+        ids = [str(i) for i in range(start, min(start + batch, len(vectors)))]
+        index.upsert(ids, vectors[start:start + batch], [{"id": i} for i in ids])
+    index.save()
+    return VectorIndex(path, ivf_min_rows, nprobe)
+
+
+def bench_chroma(path, vectors, queries, k):
+    try:
+        import chromadb
+    except ImportError:
+        print("  chroma               skipped (chromadb is not installed)")
+        return None
+    client = chromadb.PersistentClient(path=path)
+    collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+    start = time.perf_counter()
+    batch = min(4096, client.get_max_batch_size())
+    for i in range(0, len(vectors), batch):
+        ids = [str(j) for j in range(i, min(i + batch, len(vectors)))]
+        collection.add(ids=ids, embeddings=vectors[i:i + batch].tolist(), metadatas=[{"id": j} for j in ids])
+    build = time.perf_counter() - start
+
+    def search(q):
+        ids = collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])["ids"][0]
+        return [int(i) for i in ids]
+    return build, latency(search, queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=2.0, help="noise norm around a topic (1.0 = as far as the topic itself)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    vectors, queries = make_corpus(args.docs, args.dim, args.topics, args.spread, args.queries, args.seed)
+    truth = exact_top_k(vectors, queries, args.k)
+    print(f"[Bench] => {args.docs} vectors of dim {args.dim}, {args.queries} queries, recall@{args.k} vs exact")
+
+    path = tempfile.mkdtemp(prefix="vector_bench_")
+    try:
+        print(f"\n  {'backend':<20} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7}")
+
+        start = time.perf_counter()
+        flat = build_local(os.path.join(path, "flat"), vectors, args.docs + 1, 1)
+        build = time.perf_counter() - start
+        p50, p95, found = latency(lambda q: flat.search(q, args.k)[0][0], queries)
+        print(f"  {'local exact':<20} {build:8.1f} {p50 * 1e3:8.2f} {p95 * 1e3:8.2f} {recall(found, truth):7.1%}")
+
+        start = time.perf_counter()
+        flat.search(queries, args.k)
+        batched = time.perf_counter() - start
+        print(f"  {'local exact, batch':<20} {'':>8} {batched / len(queries) * 1e3:8.2f} {'':>8} {'(per query)':>7}")
+
+        start = time.perf_counter()
+        ivf = build_local(os.path.join(path, "ivf"), vectors, 0, args.nprobe[0])
+        build = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            p50, p95, found = latency(lambda q: ivf.search(q, args.k, nprobe)[0][0], queries)
+            label = f"local ivf/{len(ivf.centroids)} p{nprobe}"
+            print(f"  {label:<20} {build:8.1f} {p50 * 1e3:8.2f} {p95 * 1e3:8.2f} {recall(found, truth):7.1%}")
+            build = 0.0
+
+        result = bench_chroma(os.path.join(path, "chroma"), vectors, queries, args.k)
+        if result:
+            build, (p50, p95, found) = result
+            print(f"  {'chroma hnsw':<20} {build:8.1f} {p50 * 1e3:8.2f} {p95 * 1e3:8.2f} {recall(found, truth):7.1%}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Memory, latency and recall of the local vector index with quantized rows.
+
+    python benchmarks/vector_quantization.py --docs 100000 --dim 768 --rescore 1 4
+
+For every quantization (none / float16 / int8) and re-score factor: the size of the
+matrix the search scans (the float32 one, or the codes), the time to open the index
+and answer a first query, single-query latency and recall@k against exact float32
+search. Re-score 1 keeps the approximate order (the top k only get exact scores);
+larger factors re-score k * factor candidates from the float32 rows. --ivf runs the
+same over the IVF index.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.store.vector_index import VectorIndex
+from benchmarks.common import make_corpus
+
+
+def build(path, vectors, quantization, ivf_min_rows, batch=4096):
+    index = VectorIndex(path, ivf_min_rows, 16, quantization)
+    for start in range(0, len(vectors), batch):
+        ids = [str(i) for i in range(start, min(start + batch, len(vectors)))]
+        index.upsert(ids, vectors[start:start + batch], [{}] * len(ids))
+    index.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=2.0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--ivf", action="store_true", help="search through IVF lists instead of exactly")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    vectors, queries = make_corpus(args.docs, args.dim, args.topics, args.spread, args.queries, args.seed)
+    scores = queries @ vectors.T
+    truth = [set(row) for row in np.argpartition(-scores, args.k - 1, axis=1)[:, :args.k]]
+    del scores
+    ivf_min_rows = 0 if args.ivf else args.docs + 1
+    print(f"[Bench] => {args.docs} vectors of dim {args.dim}, {args.queries} queries, {'IVF' if args.ivf else 'flat'}, recall@{args.k} vs exact float32")
+
+    path = tempfile.mkdtemp(prefix="vector_quant_bench_")
+    try:
+        print(f"\n  {'quantization':<12} {'rescore':>7} {'scanned MB':>10} {'open+1st ms':>11} {'p50 ms':>7} {'p95 ms':>7} {'recall':>7}")
+        for quantization in [None, "float16", "int8"]:
+            index_path = os.path.join(path, quantization or "none")
+            build(index_path, vectors, quantization, ivf_min_rows)
+            for rescore in ([1] if quantization is None else args.rescore):
+                start = time.perf_counter()
+                index = VectorIndex(index_path, ivf_min_rows, 16, quantization, rescore)
+                index.search(queries[0], args.k)
+                opened = time.perf_counter() - start
+                scanned = (index.codes if quantization else index.matrix).nbytes / 2**20
+
+                times, hits = [], []
+                for q, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    rows = index.search(q, args.k)[0][0]
+                    times.append(time.perf_counter() - start)
+                    hits.append(len(set(rows) & expected) / len(expected))
+                p50, p95 = np.percentile(times, 50), np.percentile(times, 95)
+                print(f"  {quantization or 'none':<12} {rescore:>7} {scanned:10.1f} {opened * 1e3:11.1f} {p50 * 1e3:7.2f} {p95 * 1e3:7.2f} {np.mean(hits):7.1%}")
+                del index
+            shutil.rmtree(index_path)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
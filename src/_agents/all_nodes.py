@@ -4,12 +4,21 @@ from src._agents.nodes.expand import expander
 from src._agents.nodes.final import Presenter
 from src._agents.nodes.general import GeneralAssistant
 from src._agents.nodes.grader import Grader
-from src._agents.nodes.retriver import retriver
+from src._agents.nodes.retriver import shared_retriever
 
 from src._agents.nodes.router import Router
 from src._agents.state import AgentState
+from src.config import INPUT_FILE, GRAPH_OUTPUT_FILE, DEPENDENCY_MAP_FILE, BM25_PATH, VECTOR_DB_DIR
+from src.config import VECTOR_BACKEND, VECTOR_QUANTIZATION, EMBED_INFERENCE, PROCESS_START_METHOD
+from src.ingestion.scheduler import Stage, bump_generation
 from src.ingestion.repo_loader import RepoLoader
-from src.store.bm25 import BM25Builder
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.store.bm25 import BM25Builder, build_bm25_index
+from src.store.bm25_index import FORMAT_VERSION as BM25_FORMAT_VERSION
+from src.store.bm25_segments import BackgroundMerger
+from src.store.tokenizer import TOKENIZER_VERSION
 from src.store.graph import GraphBuilder
 from src.store.vector import VectorStoreBuilder
 from src.temp import ProjectSummarizer
@@ -31,16 +40,29 @@ def build_vector(state: AgentState) -> AgentState:
     """Build vector store"""
     
     print("[Vector Store] Building...")
+    #a warm retriever keeps the chroma files open, which blocks clearing the folder
+    shared_retriever.release()
     builder = VectorStoreBuilder()
     builder.build()
     return {}
 
 
+bm25_merger = BackgroundMerger(BM25_PATH, on_commit=bump_generation)
+
+
 def build_bm25(state: AgentState) -> AgentState:
-    """Build BM25 index"""
+    """Build BM25 index in its own process, so it does not fight build_vector for the GIL"""
     print("[BM25] Building...")
-    builder = BM25Builder()
-    builder.build()
+    try:
+        #not forked: build_vector, the merger and the embedder warm-up are running in threads
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(PROCESS_START_METHOD)) as executor:
+            executor.submit(build_bm25_index).result()
+    except (OSError, BrokenProcessPool) as e:
+        print(f"[BM25] => Worker process unavailable ({e}), building in place")
+        builder = BM25Builder()
+        builder.build()
+    #segment merges run here, not in the short-lived worker; the retriever reloads after each
+    bm25_merger.schedule()
     return {}
 
 
@@ -52,6 +74,22 @@ def build_graph(state: AgentState) -> AgentState:
     return {}
 
 
+# Stage order is derived from these artifacts (see IngestionScheduler):
+# the vector headers read the dependency map, so build_vector waits for build_graph;
+# build_bm25 feeds nothing, so it runs late, side by side with build_vector.
+INGESTION_STAGES = [
+    Stage("build_graph", build_graph, inputs=[INPUT_FILE], outputs=[GRAPH_OUTPUT_FILE, DEPENDENCY_MAP_FILE]),
+    Stage("build_bm25", build_bm25, inputs=[INPUT_FILE], outputs=[BM25_PATH], version=f"{BM25_FORMAT_VERSION}/{TOKENIZER_VERSION}"),
+    Stage("build_vector", build_vector, inputs=[INPUT_FILE, DEPENDENCY_MAP_FILE], outputs=[VECTOR_DB_DIR], version=f"{VECTOR_BACKEND}/{VECTOR_QUANTIZATION}/{EMBED_INFERENCE}"),
+]
+
+
+def ingest_join(state: AgentState) -> AgentState:
+    """Waits for every ingestion stage before routing"""
+    print("[Ingestion] All indexes built")
+    return {}
+
+
 def router_node(state: AgentState) -> AgentState:
     """Route query to CODE or CHAT path"""
     query = state.get('query', '')
@@ -63,7 +101,7 @@ def retriver_node(state: AgentState) -> AgentState:
     """Retrieve relevant code blocks"""
     query = state.get('query', '')
     print('query ======>', query)
-    results = retriver().search(query)
+    results = shared_retriever.search(query)
     print('-' * 70)
     print('resuls' , results)
     return {'research_results': results}
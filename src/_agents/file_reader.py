@@ -1,18 +1,17 @@
 import os
-import pickle
 from src.config import REPO_PATH, GRAPH_OUTPUT_FILE
+from src.store.source_cache import shared_source_cache
+from src.store.graph_registry import shared_graph_registry
 
 class FileReader_:
     def __init__(self):
         
         self.root_path = os.path.abspath(REPO_PATH)
-        self.graph = None
+        #shared, already loaded graph (re-read only after a rebuild)
+        self.graph = shared_graph_registry.get()
         
         
-        if os.path.exists(GRAPH_OUTPUT_FILE):
-            with open(GRAPH_OUTPUT_FILE, "rb") as f:
-                self.graph = pickle.load(f)
-        else:
+        if self.graph is None:
             print(f"[FileReader] => Warning: Graph file not found at {GRAPH_OUTPUT_FILE}")
 
     def _get_safe_path(self, file_path):
@@ -73,18 +72,13 @@ class FileReader_:
                 print( f"Error: File '{file_path}' not found.")
                 return ''
 
-            with open(full_path, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()
-            
-            
             start_idx = max(0, start_line - 1)
             
-            
+            #shared line cache, the file is not re-read for every node
             if end_line:
-                end_idx = min(len(lines), end_line)
-                selected_lines = lines[start_idx : end_idx]
+                selected_lines = shared_source_cache.read_lines(full_path, start_idx, end_line)
             else:
-                selected_lines = lines[start_idx:]
+                selected_lines = shared_source_cache.read_lines(full_path, start_idx)
 
             if with_lines:
                 with_num = []
@@ -1,6 +1,9 @@
 from langgraph.graph import StateGraph, END, START
 from src._agents.all_nodes import *
 from src._agents.state import AgentState
+from src.ingestion.scheduler import IngestionScheduler
+from src.config import WARM_UP_EMBEDDINGS
+from src.model import warm_up
 
 def should_continue_after_grader(state: AgentState) -> str:
     is_expendable = state.get('is_expendable', False)
@@ -29,9 +32,7 @@ def create_graph():
     
 
     workflow.add_node("repo_loader", repo_loader)
-    workflow.add_node("build_vector", build_vector)
-    workflow.add_node("build_bm25", build_bm25)
-    workflow.add_node("build_graph", build_graph)
+    workflow.add_node("ingest_join", ingest_join)
     workflow.add_node("router", router_node)
     workflow.add_node('architecturer', architecture_node)
     workflow.add_node("retriever", retriver_node)
@@ -51,10 +52,9 @@ def create_graph():
     )
     
    
-    workflow.add_edge("repo_loader", "build_vector")
-    workflow.add_edge("build_vector", "build_bm25")
-    workflow.add_edge("build_bm25", "build_graph")
-    workflow.add_edge("build_graph", "router")
+    #build stages ordered by the artifacts they read and write
+    IngestionScheduler(INGESTION_STAGES).wire(workflow, after="repo_loader", join="ingest_join")
+    workflow.add_edge("ingest_join", "router")
     
    
     workflow.add_conditional_edges(
@@ -90,3 +90,6 @@ def create_graph():
     return graph
 
 app = create_graph()
+
+if WARM_UP_EMBEDDINGS:
+    warm_up(background=True)
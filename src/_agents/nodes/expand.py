@@ -1,17 +1,12 @@
 import os
-import pickle
 import ast
 from src._agents.file_reader import FileReader_ 
 from src.config import *
 
 class expander:
     def __init__(self):
-        self.graph = None
         self.reader = FileReader_()
-        
-        if os.path.exists(GRAPH_OUTPUT_FILE):
-            with open(GRAPH_OUTPUT_FILE, "rb") as f:
-                self.graph = pickle.load(f)
+        self.graph = self.reader.graph
 
     def get_graph(self):
         return self.graph
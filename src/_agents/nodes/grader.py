@@ -87,10 +87,11 @@ RETURN ONLY RAW JSON. NO OTHER TEXT."""
                 
                 """
                 
+        reader = FileReader_()
         for cand in candidates:
             node_id = cand
             
-            content = FileReader_().read_file(node_id)[:1500]
+            content = reader.read_file(node_id)[:1500]
             
             my_prompt += f"""
 [ Index: {index + 1} , Id: {node_id}],
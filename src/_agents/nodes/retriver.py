@@ -1,11 +1,14 @@
 import json
-import pickle
-from langchain_chroma import Chroma
+import threading
 from src._agents.nodes.expand import expander
 from src._agents.nodes.final import Presenter
 from src._agents.nodes.grader import Grader
 from src.model import *
 from src.config import *
+from src.ingestion.scheduler import read_generation
+from src.store.bm25_segments import SegmentedBM25, read_manifest
+from src.store.tokenizer import tokenize
+from src.store.vector_backend import open_vector_backend
 import os
 
 class retriver:
@@ -15,20 +18,15 @@ class retriver:
         self.embeddings = shared_embeddings
         
         if os.path.exists(VECTOR_DB_DIR):
-            self.vector_db = Chroma(
-                persist_directory=VECTOR_DB_DIR,
-                embedding_function=self.embeddings,
-                collection_name='codebase_v1'
-            )
+            #VECTOR_BACKEND: the in-process index or Chroma
+            self.vector_db = open_vector_backend(VECTOR_DB_DIR, self.embeddings)
         else:
             print (f'[Retriver] => No vector DB Found')
             self.vector_db = None
         
-        if os.path.exists(BM25_PATH):
-            with open(BM25_PATH, "rb") as f:
-                data = pickle.load(f)
-                self.bm25 = data["model"]
-                self.bm25_nodes = data["node_map"]
+        if read_manifest(BM25_PATH) is not None:
+            #every live segment, scored with the collection-wide statistics
+            self.bm25 = SegmentedBM25(BM25_PATH)
         else:
             print("[Retriver] => BM25 Index not Found")
             self.bm25 = None
@@ -64,20 +62,17 @@ class retriver:
         vector_data = []
         
         if self.vector_db:
-            vector_data = self.vector_db.search(query=query, search_type='mmr', k= limit+5)
+            #the VECTOR_MMR_POOL most similar chunks, re-ranked for diversity
+            vector_data = self.vector_db.search(query, k= limit+5, pool=VECTOR_MMR_POOL, lambda_mult=VECTOR_MMR_LAMBDA)
             # print (f'[ConceptTool] => {[d for d in vector_data]}')
          
         bm25_data = []
         if self.bm25:
             
-            tokenized_query = query.lower().split() #simple split for now
+            tokenized_query = tokenize(query) #same tokenizer as the index
             
-            # get_top_n returns the text, we need the indices to map back to ids
-            scores = self.bm25.get_scores(tokenized_query)
-            #get top N indexes
-            top_n_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:limit*2]
-            #map index to Node ids
-            bm25_data = [self.bm25_nodes[i] for i in top_n_indices if scores[i] > 0]
+            #top N node ids with a positive score, BM25F over id / signature / docstring / body of all segments
+            bm25_data = self.bm25.search(tokenized_query, limit*2, weights=BM25F_WEIGHTS, b=BM25F_B, k1=BM25F_K1)
             
             # print(f"[ConceptTool] => BM25 found: {bm25_data}")
         
@@ -87,10 +82,46 @@ class retriver:
         #return top N
         return final_ranked_ids[:limit]
 
+
+class RetrieverService:
+    """
+    Keeps one loaded retriver per process. The indexes are opened again only when
+    the index generation changes (an ingestion stage rebuilt something); queries
+    running at that moment keep the instance they started with.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = None
+        self.generation = None
+
+    def get(self):
+        generation = read_generation()
+        current = self.current
+        if current is not None and self.generation == generation:
+            return current
+
+        with self.lock:
+            if self.current is None or self.generation != generation:
+                self.current = retriver()
+                self.generation = generation
+            return self.current
+
+    def release(self):
+        """Drops the loaded indexes (before their files are deleted or rebuilt)."""
+        with self.lock:
+            self.current = None
+            self.generation = None
+
+    def search(self, query, limit=5):
+        return self.get().search(query, limit)
+
+
+shared_retriever = RetrieverService()
+
             
 if __name__ == '__main__':
     while True:
-        r = retriver()
+        r = shared_retriever
         i = input('Enter the question: ')
 
         
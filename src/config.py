@@ -19,16 +19,23 @@ OUTPUT_DIR = STORAGE_DIR
 if not os.path.exists(STORAGE_DIR):
     os.makedirs(STORAGE_DIR)
 
-VECTOR_DB_DIR = os.path.join(STORAGE_DIR, "chroma_db")
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'local') #"local": in-process memory-mapped index (store/vector_index.py), "chroma": Chroma
+VECTOR_DB_DIR = os.path.join(STORAGE_DIR, "chroma_db" if VECTOR_BACKEND == "chroma" else "vector_index")
 
 
-BM25_PATH = os.path.join(STORAGE_DIR, "bm25_index.pkl")
+BM25_PATH = os.path.join(STORAGE_DIR, "bm25_index") #segment directories of memory-mapped .npy arrays + manifest.json
 BM25_OUTPUT_FILE = BM25_PATH 
 
 
-INPUT_FILE = os.path.join(DATA_DIR, "semantic_graph_v2.json")
+INPUT_FILE = os.path.join(DATA_DIR, "semantic_graph_v3.bin")
 DEPENDENCY_MAP_FILE = os.path.join(STORAGE_DIR, "dependency_map.json")
-GRAPH_OUTPUT_FILE = os.path.join(STORAGE_DIR, "structure_graph.pkl")
+GRAPH_OUTPUT_FILE = os.path.join(STORAGE_DIR, "structure_graph.csr") #names the current structure_graph.<n>.csr, each build writes a new one
+
+#incremental ingestion
+MANIFEST_FILE = os.path.join(STORAGE_DIR, "manifest.json")
+PARSE_CACHE_FILE = os.path.join(STORAGE_DIR, "parse_cache.pkl")
+STAGE_STATE_FILE = os.path.join(STORAGE_DIR, "stage_state.json")
+INDEX_GENERATION_FILE = os.path.join(STORAGE_DIR, "index_generation") #changes whenever an index is rebuilt
 
 
 IGNORE_DIRS = {
@@ -37,7 +44,39 @@ IGNORE_DIRS = {
     'data_cache' 
 }
 
+SOURCE_CACHE_MAX_FILES = 256 #memory-mapped source files kept open for line slicing
+
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', os.cpu_count() or 1))
+PROCESS_START_METHOD = os.getenv('PROCESS_START_METHOD', 'spawn') #worker processes start clean, forking the threaded server can deadlock them on inherited locks
+
+TOKENIZER_KEEP_IDENTIFIERS = os.getenv('TOKENIZER_KEEP_IDENTIFIERS', '1') == '1' #index build_graph as build, graph AND build_graph
+
+#BM25F query-time tuning (no rebuild needed): field weights, per-field length normalization, saturation
+BM25F_WEIGHTS = {"id": 4.0, "signature": 2.0, "docstring": 1.5, "body": 1.0}
+BM25F_B = {"id": 0.3, "signature": 0.5, "docstring": 0.75, "body": 0.75}
+BM25F_K1 = 1.2
+BM25_PRUNE_MIN_DOCS = int(os.getenv('BM25_PRUNE_MIN_DOCS', 60000)) #smaller indexes (per segment) are scored exhaustively, MaxScore only wins above this (benchmarks/bm25_pruning.py)
+BM25_SIGNATURE_MAX_LINES = 12 #def/class header lines scanned for the closing colon
+BM25_BUILD_MEMORY_MB = int(os.getenv('BM25_BUILD_MEMORY_MB', 256)) #in-memory postings before the index builder spills a sorted run
+BM25_MAX_SEGMENTS = int(os.getenv('BM25_MAX_SEGMENTS', 8)) #more live segments than this -> background merge of the smallest
+BM25_MERGE_DELETED_RATIO = float(os.getenv('BM25_MERGE_DELETED_RATIO', 0.3)) #segments with more tombstoned docs than this get rewritten
+
 MODEL_NAME = "jinaai/jina-embeddings-v2-base-code"
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 16))
+EMBED_INFERENCE = os.getenv('EMBED_INFERENCE', 'torch') #CPU only: "torch" (float32), "torch-int8" (dynamic int8 linear layers) or "onnx" (onnxruntime)
+EMBED_MIN_COSINE = float(os.getenv('EMBED_MIN_COSINE', 0.99)) #an optimized mode agreeing less with float32 on the validation texts is not used
+EMBED_ONNX_DIR = os.path.join(DATA_DIR, "onnx_models") #exported graphs, one directory per model
+WARM_UP_EMBEDDINGS = os.getenv('WARM_UP_EMBEDDINGS', '0') == '1' #load the model in the background at server start
+EMBED_CACHE_DIR = os.path.join(DATA_DIR, "embedding_cache") #outside STORAGE_DIR, shared by every ingested repo
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv('EMBED_CACHE_MAX_ENTRIES', 200000))
+VECTOR_INDEX_KEYS_FILE = os.path.join(VECTOR_DB_DIR, "index_keys.json") #file -> key its documents were embedded from
+VECTOR_WRITE_BATCH = int(os.getenv('VECTOR_WRITE_BATCH', 256)) #documents per upsert / ids per delete call
+VECTOR_IVF_MIN_ROWS = int(os.getenv('VECTOR_IVF_MIN_ROWS', 50000)) #local backend: exact search below this many chunks, IVF above
+VECTOR_IVF_NPROBE = int(os.getenv('VECTOR_IVF_NPROBE', 16)) #IVF lists scanned per query (recall vs latency)
+VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'none').lower() #local backend: "none", "float16" or "int8" copy of the vectors that search scans
+VECTOR_RESCORE_FACTOR = int(os.getenv('VECTOR_RESCORE_FACTOR', 4)) #quantized search re-scores k * this many candidates in float32
+VECTOR_MMR_POOL = int(os.getenv('VECTOR_MMR_POOL', 20)) #most similar chunks re-ranked for diversity
+VECTOR_MMR_LAMBDA = float(os.getenv('VECTOR_MMR_LAMBDA', 0.5)) #MMR: 1 = similarity only, 0 = diversity only
 
 LLM_MODEL = 'llama-3.3-70b-versatile'
 
@@ -2,13 +2,132 @@
 import os
 import ast
 import builtins
+import multiprocessing
 import networkx as nx
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from src.ingestion.indexer import SemanticIndexer
+from src.ingestion.manifest import file_hash
 
 import src.config as config
 
-def analyze_codebase(root_path):
+PARALLEL_MIN_FILES = 128  # below this a process pool costs more than it saves (a spawned worker imports for ~1.5 s)
+BUILTIN_NAMES = frozenset(dir(builtins))
+
+
+def collect_python_files(root_path):
+    """Walks the repo and returns (full_path, rel_path) pairs in os.walk order."""
+    files_found = []
+    for root, dirs, files in os.walk(root_path):
+        dirs[:] = [d for d in dirs if d not in config.IGNORE_DIRS]
+
+        for f in files:
+            if f.endswith(".py"):
+                full_path = os.path.join(root, f)
+                rel_path = os.path.relpath(full_path, root_path).replace("\\", "/")
+                files_found.append((full_path, rel_path))
+    return files_found
+
+
+def parse_file(full_path, rel_path, class_registry=None):
+    """
+    Parses a single file and returns its definitions and calls.
+    Runs inside worker processes, so it only touches its own class registry
+    and reports the registry traffic back for the merge.
+    """
+    result = {
+        "file_id": f"file::{rel_path}",
+        "rel_path": rel_path,
+        "lines": None,
+        "definitions": {},
+        "calls": [],
+        "registry_writes": [],
+        "registry_reads": set(),
+        "error": None,
+        "syntax_error": False
+    }
+    registry = {} if class_registry is None else class_registry
+    idx = None
+
+    try:
+        with open(full_path, encoding="utf8", errors="ignore") as file_obj:
+            content = file_obj.read()
+            lines = content.splitlines()
+        result["lines"] = len(lines)
+
+        tree = ast.parse(content)
+
+        #traverse in the tree get the function, class
+        idx = SemanticIndexer(full_path, rel_path, registry)
+        idx.visit(tree)
+
+        result["definitions"] = idx.definitions
+        result["calls"] = idx.calls
+
+    except SyntaxError:
+        result["syntax_error"] = True
+        result["error"] = "syntax"
+    except Exception as e:
+        result["error"] = str(e)
+
+    if idx:
+        result["registry_writes"] = idx.registry_writes
+        result["registry_reads"] = idx.registry_reads
+
+    return result
+
+
+def parse_files(files, workers=None):
+    """Parses all files, in a process pool when the repo is big enough. Keeps input order."""
+    workers = workers or config.PARSE_WORKERS
+    full_paths = [f[0] for f in files]
+    rel_paths = [f[1] for f in files]
+
+    if workers > 1 and len(files) >= PARALLEL_MIN_FILES:
+        chunksize = max(1, len(files) // (workers * 8))
+        try:
+            #spawned, not forked: the server process already runs threads (LangGraph, merger, warm-up)
+            context = multiprocessing.get_context(config.PROCESS_START_METHOD)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                return list(executor.map(parse_file, full_paths, rel_paths, chunksize=chunksize))
+        except (OSError, BrokenProcessPool) as e:
+            print(f" [Analyzer] => Process pool unavailable ({e}), parsing sequentially")
+
+    return [parse_file(full, rel) for full, rel in files]
+
+
+def depends_on_registry(result, class_registry):
+    """True when the isolated parse looked up a class attribute some earlier file already registered."""
+    for cls, attr in result["registry_reads"]:
+        if attr in class_registry.get(cls, {}):
+            return True
+    return False
+
+
+def build_suffix_index(all_defs):
+    """
+    Maps every dotted suffix of every definition to the first definition (in all_defs order)
+    ending with it, so `k.endswith(".X.Y")` becomes one dict lookup.
+    src.util.solve -> {"util.solve": ..., "solve": ...}
+    """
+    suffix_index = {}
+    for k in all_defs:
+        pos = k.find(".")
+        while pos != -1:
+            suffix = k[pos + 1:]
+            if suffix not in suffix_index:
+                suffix_index[suffix] = k
+            pos = k.find(".", pos + 1)
+    return suffix_index
+
+
+def analyze_codebase(root_path, parse_cache=None, changed_paths=None):
+    """
+    parse_cache (rel_path -> {hash, result}) lets a re-ingest skip files whose content
+    did not change. It is refreshed in place with this run's files.
+    changed_paths (from a git diff) marks the only files that need hashing again.
+    """
     print(f" [Analyzer] => Starting Semantic Analysis: {root_path}")
 
     nodes = {}
@@ -18,55 +137,76 @@ def analyze_codebase(root_path):
     all_defs = {} 
     all_calls = [] 
 
-    for root, dirs, files in os.walk(root_path):
-        dirs[:] = [d for d in dirs if d not in config.IGNORE_DIRS]
+    files = collect_python_files(root_path)
+    if parse_cache is None:
+        parse_cache = {}
 
-        for f in files:
-            if f.endswith(".py"):
-                full_path = os.path.join(root, f)
-                rel_path = os.path.relpath(full_path, root_path).replace("\\", "/")
-                file_id = f"file::{rel_path}"
+    hashes = {}
+    for full_path, rel_path in files:
+        cached = parse_cache.get(rel_path)
+        if changed_paths is not None and cached and rel_path not in changed_paths:
+            hashes[rel_path] = cached["hash"]  # untouched by the diff, no need to read it
+        else:
+            hashes[rel_path] = file_hash(full_path)
 
-                try:
-                    
-                    with open(full_path, encoding="utf8", errors="ignore") as file_obj:
-                        content = file_obj.read()
-                        lines = content.splitlines()
-                        
-                    #Intilize the file nodes
-                    nodes[file_id] = {
-                        "id": file_id,
-                        "type": "module",        
-                        "file": rel_path,
-                        "name": os.path.basename(rel_path),
-                        "start": 1,
-                        "end": len(lines),       
-                       
-                    }
+    #only files with new content are parsed again
+    to_parse = [
+        (full_path, rel_path) for full_path, rel_path in files
+        if hashes[rel_path] is None or parse_cache.get(rel_path, {}).get("hash") != hashes[rel_path]
+    ]
+    print(f" [Analyzer] => Parsing {len(to_parse)} of {len(files)} files")
 
-                    
-                    tree = ast.parse(content)
-                    
-                    #traverse in the tree get the function, class
-                    idx = SemanticIndexer(full_path, rel_path, all_class)
-                    idx.visit(tree)
- 
-                    all_defs.update(idx.definitions)
-                    all_calls.extend(idx.calls)
-                    
+    for (full_path, rel_path), result in zip(to_parse, parse_files(to_parse)):
+        parse_cache[rel_path] = {"hash": hashes[rel_path], "result": result}
+
+    for rel_path in [p for p in parse_cache if p not in hashes]:
+        del parse_cache[rel_path]
+
+    results = [parse_cache[rel_path]["result"] for full_path, rel_path in files]
+
+    #merging in walk order, so the output is the same as a single process run
+    for (full_path, rel_path), result in zip(files, results):
+        
+        #the isolated parse missed types registered by earlier files, redo it with the real registry
+        if depends_on_registry(result, all_class):
+            result = parse_file(full_path, rel_path, all_class)
+        else:
+            for cls, attr, vtype in result["registry_writes"]:
+                if cls not in all_class:
+                    all_class[cls] = {}
+                all_class[cls][attr] = vtype
+
+        file_id = result["file_id"]
 
-                    #connecting the edges files to the function
-                    for def_id, meta in idx.definitions.items():
-                        edges.append({
-                            "source": file_id,
-                            "target": def_id,
-                            "relation": "calls"
-                        })
-
-                except SyntaxError:
-                    print(f" [Analyzer] => Syntax Error in {rel_path}")
-                except Exception as e:  
-                    print(f" [Analyzer] => Error parsing {rel_path}: {e}")
+        #Intilize the file nodes
+        if result["lines"] is not None:
+            nodes[file_id] = {
+                "id": file_id,
+                "type": "module",        
+                "file": rel_path,
+                "name": os.path.basename(rel_path),
+                "start": 1,
+                "end": result["lines"],       
+               
+            }
+
+        if result["syntax_error"]:
+            print(f" [Analyzer] => Syntax Error in {rel_path}")
+            continue
+        if result["error"] is not None:
+            print(f" [Analyzer] => Error parsing {rel_path}: {result['error']}")
+            continue
+
+        all_defs.update(result["definitions"])
+        all_calls.extend(result["calls"])
+
+        #connecting the edges files to the function
+        for def_id, meta in result["definitions"].items():
+            edges.append({
+                "source": file_id,
+                "target": def_id,
+                "relation": "calls"
+            })
                     
     #creating all module level nodes        
     for def_id, meta in all_defs.items():
@@ -84,6 +224,8 @@ def analyze_codebase(root_path):
         short_name = k.split(".")[-1]
         name_lookup[short_name].append(k) # [solve] = [src.util.solve]
 
+    suffix_index = build_suffix_index(all_defs)
+
     for c in all_calls: #mapping function name -> calling name
         target = c["target_hint"] #Calling function name src.util.solve 
         matches = []
@@ -92,15 +234,15 @@ def analyze_codebase(root_path):
             matches.append(target) 
         
         if not matches:  #if not same file, import check
-            candidates = [k for k in all_defs if k.endswith(f".{target}")] 
-            if candidates:
-                matches = candidates[:1]
+            candidate = suffix_index.get(f"{target}")
+            if candidate:
+                matches = [candidate]
         
         if not matches and "." not in target:
             matches = name_lookup.get(target, [])
         
         if not matches: #marking as external
-            if target in dir(builtins): continue
+            if target in BUILTIN_NAMES: continue
             
             external_id = f"external::{target}"
             if external_id not in nodes:
@@ -124,6 +266,7 @@ def analyze_codebase(root_path):
     return {
         "nodes": list(nodes.values()),
         "edges": edges,
+        "files": hashes,
         "stats": {
             "files": sum(1 for n in nodes.values() if n.get("type") == "module"),
             "definitions": len(all_defs),
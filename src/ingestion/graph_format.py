@@ -0,0 +1,227 @@
+import sys
+import json
+import mmap
+import struct
+from array import array
+
+# Binary replacement for the analyzer's json output.
+#
+# [header][node blocks][edge blocks][string table][meta json]
+#
+# Every block holds up to BLOCK_ROWS rows stored column by column. Text columns
+# (ids, files, types, labels) are indexes into one interned string table, so an
+# id used by a node and by hundreds of edges is stored once. Whatever does not fit
+# a column (docstring, bases, decorators ...) goes into a per-row json "extras" blob.
+
+MAGIC = b"SCG1"
+VERSION = 1
+BLOCK_ROWS = 4096
+
+HEADER = struct.Struct("<4sIQQQQ")  # magic, version, nodes, edges, strings, meta offsets
+COUNT = struct.Struct("<I")
+
+NO_STRING = 0xFFFFFFFF
+NO_INT = -2 ** 31
+
+NODE_STR_COLUMNS = ["id", "type", "file", "label", "name", "role"]
+NODE_INT_COLUMNS = ["start", "end"]
+EDGE_STR_COLUMNS = ["source", "target", "relation"]
+EDGE_INT_COLUMNS = ["line"]
+
+
+def _to_bytes(arr):
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _from_bytes(typecode, buffer):
+    arr = array(typecode)
+    arr.frombytes(buffer)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+class _StringPool:
+    """Interns strings while the blocks are written."""
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def intern(self, value):
+        if value is None:
+            return NO_STRING
+        idx = self.index.get(value)
+        if idx is None:
+            idx = len(self.strings)
+            self.index[value] = idx
+            self.strings.append(value)
+        return idx
+
+    def to_bytes(self):
+        offsets = array("Q", [0])
+        blob = bytearray()
+        for s in self.strings:
+            blob += s.encode("utf-8", errors="surrogatepass")
+            offsets.append(len(blob))
+        return COUNT.pack(len(self.strings)) + _to_bytes(offsets) + bytes(blob)
+
+
+def _write_table(f, rows, str_columns, int_columns, pool):
+    """Writes rows as column blocks, returns the row count."""
+    total = 0
+    for start in range(0, len(rows), BLOCK_ROWS):
+        block = rows[start:start + BLOCK_ROWS]
+        parts = [COUNT.pack(len(block))]
+
+        for col in str_columns:
+            values = array("I", (pool.intern(row[col]) if isinstance(row.get(col), str) else NO_STRING for row in block))
+            parts.append(_to_bytes(values))
+        for col in int_columns:
+            values = array("i", (row[col] if isinstance(row.get(col), int) and not isinstance(row.get(col), bool) else NO_INT for row in block))
+            parts.append(_to_bytes(values))
+
+        #everything that is not a typed column
+        extra_lens = array("I")
+        extra_blob = bytearray()
+        for row in block:
+            extras = {}
+            for key, value in row.items():
+                if key in str_columns and isinstance(value, str):
+                    continue
+                if key in int_columns and isinstance(value, int) and not isinstance(value, bool):
+                    continue
+                extras[key] = value
+            encoded = json.dumps(extras).encode("utf-8") if extras else b""
+            extra_lens.append(len(encoded))
+            extra_blob += encoded
+        parts.append(_to_bytes(extra_lens))
+        parts.append(bytes(extra_blob))
+
+        f.write(b"".join(parts))
+        total += len(block)
+    return total
+
+
+def write_semantic_graph(data, path):
+    """Writes analyze_codebase output in the binary columnar format."""
+    pool = _StringPool()
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0))
+
+        nodes_off = f.tell()
+        node_count = _write_table(f, data["nodes"], NODE_STR_COLUMNS, NODE_INT_COLUMNS, pool)
+
+        edges_off = f.tell()
+        edge_count = _write_table(f, data["edges"], EDGE_STR_COLUMNS, EDGE_INT_COLUMNS, pool)
+
+        strings_off = f.tell()
+        f.write(pool.to_bytes())
+
+        meta_off = f.tell()
+        meta = {
+            "stats": data.get("stats", {}),
+            "files": data.get("files", {}),
+            "node_count": node_count,
+            "edge_count": edge_count
+        }
+        f.write(json.dumps(meta).encode("utf-8"))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, nodes_off, edges_off, strings_off, meta_off))
+
+
+class SemanticGraphReader:
+    """
+    Streams nodes and edges back out of a file written by write_semantic_graph.
+    The file is memory-mapped, so only the block being decoded is ever in memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._nodes_off, self._edges_off, self._strings_off, meta_off = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a semantic graph file (v{VERSION})")
+
+        meta = json.loads(self._mm[meta_off:].decode("utf-8"))
+        self.stats = meta["stats"]
+        self.files = meta["files"]
+        self.node_count = meta["node_count"]
+        self.edge_count = meta["edge_count"]
+
+        count, = COUNT.unpack_from(self._mm, self._strings_off)
+        offsets_start = self._strings_off + COUNT.size
+        self._string_offsets = _from_bytes("Q", self._mm[offsets_start:offsets_start + 8 * (count + 1)])
+        self._blob_start = offsets_start + 8 * (count + 1)
+        self._strings = {}
+
+    def string(self, idx):
+        """Decodes one interned string on first use."""
+        if idx == NO_STRING:
+            return None
+        value = self._strings.get(idx)
+        if value is None:
+            a = self._blob_start + self._string_offsets[idx]
+            b = self._blob_start + self._string_offsets[idx + 1]
+            value = self._mm[a:b].decode("utf-8", errors="surrogatepass")
+            self._strings[idx] = value
+        return value
+
+    def _iter_table(self, offset, total, str_columns, int_columns):
+        pos = offset
+        seen = 0
+        while seen < total:
+            n, = COUNT.unpack_from(self._mm, pos)
+            pos += COUNT.size
+
+            columns = []
+            for col in str_columns:
+                columns.append((col, True, _from_bytes("I", self._mm[pos:pos + 4 * n])))
+                pos += 4 * n
+            for col in int_columns:
+                columns.append((col, False, _from_bytes("i", self._mm[pos:pos + 4 * n])))
+                pos += 4 * n
+            extra_lens = _from_bytes("I", self._mm[pos:pos + 4 * n])
+            pos += 4 * n
+
+            for row in range(n):
+                item = {}
+                for col, is_str, values in columns:
+                    value = values[row]
+                    if is_str:
+                        if value != NO_STRING:
+                            item[col] = self.string(value)
+                    elif value != NO_INT:
+                        item[col] = value
+                if extra_lens[row]:
+                    item.update(json.loads(self._mm[pos:pos + extra_lens[row]].decode("utf-8")))
+                    pos += extra_lens[row]
+                yield item
+
+            seen += n
+
+    def iter_nodes(self):
+        return self._iter_table(self._nodes_off, self.node_count, NODE_STR_COLUMNS, NODE_INT_COLUMNS)
+
+    def iter_edges(self):
+        return self._iter_table(self._edges_off, self.edge_count, EDGE_STR_COLUMNS, EDGE_INT_COLUMNS)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -23,6 +23,11 @@ class SemanticIndexer(ast.NodeVisitor):
         self.scope_vars = defaultdict(dict)
         self.return_types = {} 
         self.current_class = None
+        
+        #class registry traffic, lets a parse done in isolation be merged later
+        self.registry_writes = []
+        self.registry_reads = set()
+        self.own_attrs = set()
 
     def _scope(self):
         return ".".join(self.scope_stack)
@@ -55,6 +60,8 @@ class SemanticIndexer(ast.NodeVisitor):
         if "." in name:
             obj, attr = name.split(".", 1)
             obj_type = self._find_var_type(obj)
+            if obj_type and (obj_type, attr) not in self.own_attrs:
+                self.registry_reads.add((obj_type, attr))
             if obj_type and obj_type in self.global_class_registry:
                  return self.global_class_registry[obj_type].get(attr)
              
@@ -194,6 +201,8 @@ class SemanticIndexer(ast.NodeVisitor):
                     if self.current_class not in self.global_class_registry:
                         self.global_class_registry[self.current_class] = {}
                     self.global_class_registry[self.current_class][t.attr] = vtype
+                    self.registry_writes.append((self.current_class, t.attr, vtype))
+                    self.own_attrs.add((self.current_class, t.attr))
         self.generic_visit(node)
 
     def visit_Call(self, node):
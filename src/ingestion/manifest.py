@@ -0,0 +1,81 @@
+import os
+import json
+import pickle
+import hashlib
+from src.config import *
+
+PARSE_CACHE_VERSION = 1
+
+
+def file_hash(path):
+    """Content hash of a source file (raw bytes, so line endings count). None if unreadable."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "sha1").hexdigest()
+    except OSError:
+        return None
+
+
+def load_parse_cache():
+    """Per-file isolated parse results from the last ingest: rel_path -> {hash, result}."""
+    if not os.path.exists(PARSE_CACHE_FILE):
+        return {}
+    try:
+        with open(PARSE_CACHE_FILE, "rb") as f:
+            package = pickle.load(f)
+        if package.get("version") != PARSE_CACHE_VERSION:
+            return {}
+        return package["files"]
+    except Exception as e:
+        print(f"[Manifest] => Ignoring unreadable parse cache: {e}")
+        return {}
+
+
+def save_parse_cache(parse_cache):
+    with open(PARSE_CACHE_FILE, "wb") as f:
+        pickle.dump({"version": PARSE_CACHE_VERSION, "files": parse_cache}, f)
+
+
+class Manifest:
+    """
+    path -> content hash of every analyzed file, plus the commit they were analyzed at.
+    Stored under STORAGE_DIR, so every re-ingest can tell what actually changed. The
+    builders key their own artifacts by file (BM25 file_hashes, vector index keys), so
+    per-file node and edge ids are not kept here.
+    """
+    def __init__(self, files=None, commit=None):
+        self.files = files or {}
+        self.commit = commit
+
+    @classmethod
+    def load(cls, path=MANIFEST_FILE):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r") as f:
+            package = json.load(f)
+        return cls(package.get("files", {}), package.get("commit"))
+
+    @classmethod
+    def from_analysis(cls, data, commit=None):
+        """The analyzer's per-file content hashes."""
+        files = {rel_path: {"hash": h} for rel_path, h in data.get("files", {}).items()}
+        return cls(files, commit)
+
+    def hashes(self):
+        return {rel_path: entry["hash"] for rel_path, entry in self.files.items()}
+
+    def diff(self, previous):
+        """Returns (added, changed, removed) file paths compared to an older manifest."""
+        added, changed = [], []
+        for rel_path, entry in self.files.items():
+            old = previous.files.get(rel_path)
+            if old is None:
+                added.append(rel_path)
+            elif old["hash"] != entry["hash"]:
+                changed.append(rel_path)
+        removed = [p for p in previous.files if p not in self.files]
+        return added, changed, removed
+
+    def save(self, path=MANIFEST_FILE):
+        with open(path, "w") as f:
+            json.dump({"files": self.files, "commit": self.commit}, f)
@@ -2,6 +2,9 @@ import os
 import json
 
 from src.ingestion.analyzer import analyze_codebase
+from src.ingestion.graph_format import write_semantic_graph
+from src.ingestion.manifest import Manifest, load_parse_cache, save_parse_cache
+from src.store.source_cache import shared_source_cache
 import os
 import shutil
 import stat
@@ -16,35 +19,138 @@ class RepoLoader:
             print("No URL provided.")
             exit()
 
+        #release mapped files before the checkout changes under them
+        shared_source_cache.clear()
+
+        #already cloned? pull only what changed since the last ingest
+        updated = False
+        change_set = None
+        if self.can_update(repo_url):
+            try:
+                change_set = self.update(Manifest.load().commit)
+                updated = True
+            except Exception as e:
+                print(f" [Repo Loader] => Update failed ({e}), cloning again...")
+
+        if not updated:
+            self.clone(repo_url)
+        elif change_set is not None and not any(change_set.values()) and os.path.exists(INPUT_FILE):
+            print('[Repo Loader] => Already up to date, nothing to re-ingest')
+            return
+
+
+        if not os.path.exists(REPO_PATH):
+            print(f"Error: Path '{REPO_PATH}' does not exist.")
+        else:
+            changed_paths = None
+            if change_set is not None:
+                changed_paths = set(change_set["added"]) | set(change_set["changed"])
+
+            parse_cache = load_parse_cache()
+            data = analyze_codebase(REPO_PATH, parse_cache, changed_paths)
+            save_parse_cache(parse_cache)
+
+            write_semantic_graph(data, INPUT_FILE)
+
+            #the builders diff their own artifacts against these hashes. The commit is
+            #recorded only now, so a failed ingest is diffed again from the last good one
+            previous = Manifest.load()
+            manifest = Manifest.from_analysis(data, Repo(REPO_PATH).head.commit.hexsha)
+            added, changed, removed = manifest.diff(previous)
+            manifest.save()
+
+            print(f"   Graph saved to {INPUT_FILE}")
+            print(f"   Files: {data['stats']['files']}")
+            print(f"   Definitions: {data['stats']['definitions']}")
+            print(f"   Calls/Edges: {data['stats']['calls']}")
+            print(f"   Changed since last ingest: +{len(added)} ~{len(changed)} -{len(removed)}")
+
+    def clone(self, repo_url):
+        """Fresh shallow clone into REPO_PATH."""
         path_url = REPO_PATH
-        
+
         def remove_readonly(func, path, exc_info):
             os.chmod(path, stat.S_IWRITE)
             func(path)
-        
+
         if os.path.exists(path_url):
             print(f"Cleaning up existing data at {path_url}...")
             shutil.rmtree(path_url, onexc=remove_readonly)
         print(f" [Repo Loader] => Cloning {repo_url}...")
-        
+
         try:
             Repo.clone_from(repo_url, path_url, depth=1)
             print('[Repo Loader] => Repo loaded successfully!!!')
-            
+
         except Exception as e:
             print(f" [Repo Loader] => Error cloning repo: {e}")
             raise
 
-        
-        if not os.path.exists(REPO_PATH):
-            print(f"Error: Path '{REPO_PATH}' does not exist.")
-        else:
-            data = analyze_codebase(REPO_PATH)
-            
-            with open(INPUT_FILE, "w") as f:
-                json.dump(data, f, indent=2)
+    def can_update(self, repo_url):
+        """True when REPO_PATH is a clone of the same remote."""
+        if not os.path.isdir(os.path.join(REPO_PATH, ".git")):
+            return False
+        try:
+            repo = Repo(REPO_PATH)
+            return any(url == repo_url for url in repo.remotes.origin.urls)
+        except Exception:
+            return False
 
-            print(f"   Graph saved to {INPUT_FILE}")
-            print(f"   Files: {data['stats']['files']}")
-            print(f"   Definitions: {data['stats']['definitions']}")
-            print(f"   Calls/Edges: {data['stats']['calls']}")
+    def is_source_file(self, rel_path):
+        """Same filter the analyzer walk applies: .py files outside IGNORE_DIRS."""
+        if not rel_path or not rel_path.endswith(".py"):
+            return False
+        return not any(part in IGNORE_DIRS for part in rel_path.split("/")[:-1])
+
+    def update(self, since=None):
+        """
+        Fetches the remote head and moves the checkout to it.
+        Returns the .py paths the git diff from `since` (the last ingested commit) touched:
+        {"added", "changed", "removed"}, or None when that commit is unknown.
+        """
+        repo = Repo(REPO_PATH)
+        try:
+            old_commit = repo.commit(since) if since else None
+        except Exception:
+            old_commit = None  # not in the shallow history, every file is hashed again
+
+        print(f" [Repo Loader] => Fetching updates for {REPO_PATH}...")
+        fetched = repo.remotes.origin.fetch(depth=1)
+
+        tracking = None
+        if not repo.head.is_detached:
+            tracking = repo.active_branch.tracking_branch()
+        new_commit = tracking.commit if tracking is not None else fetched[0].commit
+
+        if old_commit is None:
+            repo.head.reset(new_commit, index=True, working_tree=True)
+            print(f" [Repo Loader] => No ingested commit to diff from, checked out {new_commit.hexsha[:8]}")
+            return None
+
+        change_set = {"added": [], "changed": [], "removed": []}
+        if new_commit.hexsha == old_commit.hexsha:
+            #a failed ingest may have left the checkout elsewhere
+            repo.head.reset(new_commit, index=True, working_tree=True)
+            return change_set
+
+        for diff in old_commit.diff(new_commit):
+            if diff.change_type == "A":
+                added, removed = diff.b_path, None
+            elif diff.change_type == "D":
+                added, removed = None, diff.a_path
+            elif diff.change_type == "R":
+                added, removed = diff.b_path, diff.a_path
+            else:
+                if self.is_source_file(diff.b_path):
+                    change_set["changed"].append(diff.b_path)
+                continue
+
+            if self.is_source_file(added):
+                change_set["added"].append(added)
+            if self.is_source_file(removed):
+                change_set["removed"].append(removed)
+
+        repo.head.reset(new_commit, index=True, working_tree=True)
+        print(f" [Repo Loader] => {old_commit.hexsha[:8]} -> {new_commit.hexsha[:8]}: "
+              f"+{len(change_set['added'])} ~{len(change_set['changed'])} -{len(change_set['removed'])} .py files")
+        return change_set
@@ -0,0 +1,162 @@
+import os
+import json
+import uuid
+import threading
+from src.config import *
+from src.ingestion.manifest import file_hash
+
+
+def read_generation():
+    """Id of the current set of index artifacts, None before the first build."""
+    try:
+        with open(INDEX_GENERATION_FILE, "r") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def bump_generation():
+    """Tells long-lived readers (the retriever service) that an index was rebuilt."""
+    tmp_path = INDEX_GENERATION_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, INDEX_GENERATION_FILE)
+
+
+class Stage:
+    """
+    One ingestion step and the artifacts (file paths) it reads and writes.
+    Bumping `version` (e.g. a new output format) forces the next run.
+    """
+    def __init__(self, name, run, inputs, outputs, version=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.version = version
+
+
+class IngestionScheduler:
+    """
+    Orders ingestion stages from their declared artifacts: a stage runs after every
+    stage that writes one of its inputs. A stage is skipped when its outputs exist and
+    its inputs hash the same as on its last successful run.
+    """
+    def __init__(self, stages, state_file=STAGE_STATE_FILE):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = state_file
+        self.lock = threading.Lock()
+
+        self.producers = {}
+        for stage in stages:
+            for path in stage.outputs:
+                if path in self.producers:
+                    raise ValueError(f"{path} is written by both {self.producers[path]} and {stage.name}")
+                self.producers[path] = stage.name
+
+        self.order()  # fail early on cycles
+
+    def dependencies(self, name):
+        """Stages that write an input of `name`, in declaration order."""
+        deps = []
+        for path in self.stages[name].inputs:
+            producer = self.producers.get(path)
+            if producer and producer != name and producer not in deps:
+                deps.append(producer)
+        return deps
+
+    def order(self):
+        """Stage names grouped into levels; stages in the same level can run together."""
+        remaining = list(self.stages)
+        done = set()
+        levels = []
+        while remaining:
+            level = [n for n in remaining if all(d in done for d in self.dependencies(n))]
+            if not level:
+                raise ValueError(f"Cyclic ingestion stages: {remaining}")
+            levels.append(level)
+            done.update(level)
+            remaining = [n for n in remaining if n not in done]
+        return levels
+
+    def sinks(self):
+        """Stages nothing else waits on."""
+        needed = {d for name in self.stages for d in self.dependencies(name)}
+        return [name for name in self.stages if name not in needed]
+
+    def run_levels(self):
+        """
+        Levels the stages run in: each stage as late as its dependents allow, so a stage
+        nothing waits on (build_bm25) runs in the last level, next to the slow stages,
+        instead of next to the ones that merely have no inputs from other stages.
+        """
+        levels = self.order()
+        latest = {}
+        for level in reversed(levels):
+            for name in level:
+                dependents = [n for n in self.stages if name in self.dependencies(n)]
+                latest[name] = min(latest[n] for n in dependents) - 1 if dependents else len(levels) - 1
+        return [[name for name in self.stages if latest[name] == i] for i in range(len(levels))]
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def fingerprint(self, stage):
+        fingerprint = {path: file_hash(path) if os.path.isfile(path) else None for path in stage.inputs}
+        if stage.version is not None:
+            fingerprint["version"] = stage.version
+        return fingerprint
+
+    def is_fresh(self, stage, fingerprint):
+        if not all(os.path.exists(path) for path in stage.outputs):
+            return False
+        if any(h is None for h in fingerprint.values()):
+            return False
+        with self.lock:
+            return self.load_state().get(stage.name) == fingerprint
+
+    def record(self, stage, fingerprint):
+        with self.lock:
+            state = self.load_state()
+            state[stage.name] = fingerprint
+            with open(self.state_file, "w") as f:
+                json.dump(state, f, indent=2)
+
+    def node(self, name):
+        """Wraps a stage as a graph node that skips itself when nothing it reads changed."""
+        stage = self.stages[name]
+
+        def run_stage(state):
+            fingerprint = self.fingerprint(stage)
+            if self.is_fresh(stage, fingerprint):
+                print(f"[Scheduler] => {name} skipped, inputs unchanged")
+                return {}
+            result = stage.run(state)
+            self.record(stage, fingerprint)
+            bump_generation()
+            return result or {}
+
+        run_stage.__name__ = name
+        return run_stage
+
+    def wire(self, workflow, after, join):
+        """
+        Adds every stage to a StateGraph between the `after` and `join` nodes, one
+        barrier per level of run_levels(). LangGraph runs a superstep until all of its
+        tasks are done anyway, so a stage waits on the whole previous level.
+        """
+        for name in self.stages:
+            workflow.add_node(name, self.node(name))
+
+        previous = [after]
+        for level in self.run_levels():
+            for name in level:
+                workflow.add_edge(previous if len(previous) > 1 else previous[0], name)
+            previous = level
+        workflow.add_edge(previous if len(previous) > 1 else previous[0], join)
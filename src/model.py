@@ -1,12 +1,44 @@
-import torch
-from transformers import AutoModel
+import os
+import re
+import threading
+import numpy as np
 from typing import List
+from src.config import EMBED_BATCH_SIZE, MODEL_NAME, EMBED_INFERENCE, EMBED_MIN_COSINE, EMBED_ONNX_DIR
+
+INFERENCE_MODES = ("torch", "torch-int8", "onnx")
+
+#embedded by float32 and by an optimized mode before the latter is used
+VALIDATION_TEXTS = [
+    "def add_edge(self, u, v, **attr):\n    self._adj.setdefault(u, {})[v] = attr\n    return self",
+    "class LRUCache:\n    \"\"\"Keeps the most recently used entries.\"\"\"\n    def __init__(self, size):\n        self.size = size\n        self.data = OrderedDict()",
+    "import os\nimport json\n\nCONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.json')",
+    "for i, row in enumerate(matrix):\n    if not row.any():\n        continue\n    total += row.sum() / (i + 1)",
+    "async def fetch(session, url):\n    async with session.get(url, timeout=10) as response:\n        response.raise_for_status()\n        return await response.json()",
+    "how are the graph nodes loaded from disk",
+    "parse command line arguments and start the server",
+    "SELECT name, COUNT(*) FROM users GROUP BY name HAVING COUNT(*) > 1",
+]
 
 class EmbeddingModel:
-    def __init__(self, model_name: str = 'jinaai/jina-embeddings-v2-base-code') -> None:
+    """
+    Jina code embedder. On CPU, `inference` can swap the float32 eager model for
+    dynamic int8 linear layers ("torch-int8") or an exported ONNX graph run by
+    onnxruntime ("onnx"). A swapped mode is only kept if its embeddings of
+    VALIDATION_TEXTS agree with float32 by at least min_cosine.
+    """
+    def __init__(self, model_name: str = 'jinaai/jina-embeddings-v2-base-code', batch_size: int = EMBED_BATCH_SIZE,
+                 inference: str = EMBED_INFERENCE, min_cosine: float = EMBED_MIN_COSINE) -> None:
+        if inference not in INFERENCE_MODES:
+            raise ValueError(f"Unknown EMBED_INFERENCE {inference!r}, expected one of {INFERENCE_MODES}")
         print(f"[Embedder] => Loading {model_name}...")
         
+        #torch/transformers are imported here, so importing this module stays cheap
+        import torch
+        from transformers import AutoModel
+        
+        self.torch = torch
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.batch_size = batch_size
         
         print(f'[Embedder] => Using {self.device}')
         
@@ -14,17 +46,149 @@ class EmbeddingModel:
             model_name, trust_remote_code=True
         ).to(self.device).eval()
         
+        self.dim = self.model.config.hidden_size
+        self.model_name = model_name
+        self.inference = "torch"
+        self.session = None
+        
         print(f"Model loaded with {self.device}")
+        
+        if inference != "torch":
+            if self.device != "cpu":
+                print(f"[Embedder] => {inference} is a CPU mode, keeping float32 on {self.device}")
+            else:
+                self.use_inference(inference, min_cosine)
+
+    def use_inference(self, inference: str, min_cosine: float) -> None:
+        """Switches to an optimized CPU mode if it agrees with float32 on VALIDATION_TEXTS."""
+        baseline = self._encode(VALIDATION_TEXTS)
+        model = self.model
+        try:
+            if inference == "torch-int8":
+                self.model = self.torch.ao.quantization.quantize_dynamic(model, {self.torch.nn.Linear}, dtype=self.torch.qint8)
+            else:
+                self.load_onnx()
+            self.inference = inference
+            cosine = cosine_agreement(baseline, self._encode(VALIDATION_TEXTS))
+        except Exception as e:
+            print(f"[Embedder] => {inference} unavailable ({e}), keeping float32")
+            self.model, self.session, self.inference = model, None, "torch"
+            return
+        
+        print(f"[Embedder] => {inference} vs float32: min cosine {cosine.min():.4f}, mean {cosine.mean():.4f}")
+        if cosine.min() < min_cosine:
+            print(f"[Embedder] => {inference} agrees less than {min_cosine}, keeping float32")
+            self.model, self.session, self.inference = model, None, "torch"
+        elif inference == "onnx":
+            #queries and documents both run in onnxruntime now, the eager model only holds memory
+            self.model = None
+
+    def load_onnx(self) -> None:
+        """Exports the encoder once (EMBED_ONNX_DIR), then opens it in onnxruntime."""
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        path = os.path.join(EMBED_ONNX_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", self.model_name), "model.onnx")
+        if not os.path.exists(path):
+            print(f"[Embedder] => Exporting {self.model_name} to {path}...")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            sample = self.tokenizer(VALIDATION_TEXTS[:2], padding=True, return_tensors="pt")
+            axes = {0: "batch", 1: "sequence"}
+            tmp_path = path + ".tmp"
+            self.torch.onnx.export(
+                self.model,
+                (sample["input_ids"], sample["attention_mask"]),
+                tmp_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={"input_ids": axes, "attention_mask": axes, "last_hidden_state": axes},
+                opset_version=17
+            )
+            os.replace(tmp_path, path)
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = os.cpu_count() or 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) float32 embeddings of one batch, in the current inference mode."""
+        if self.session is None:
+            with self.torch.inference_mode():
+                return np.asarray(self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True), dtype=np.float32)
+        
+        #same as the model's encode: truncated tokens, mean of the last hidden states over the mask
+        tokens = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        mask = tokens["attention_mask"].astype(np.int64)
+        hidden = self.session.run(None, {"input_ids": tokens["input_ids"].astype(np.int64), "attention_mask": mask})[0]
+        weights = mask[:, :, None].astype(np.float32)
+        return (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
 
     
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-    
-        with torch.no_grad():
-            return self.model.encode(texts).tolist()
+    def embed_documents(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        """
+        Embeds texts in batches of similar length (less padding per batch).
+        Returns a (len(texts), dim) float32 array in the input order.
+        """
+        batch_size = batch_size or self.batch_size
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return vectors
+
+        #shortest first, so each batch pads to a similar length
+        order = np.argsort([len(t) for t in texts], kind="stable")
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            vectors[batch] = self._encode([texts[i] for i in batch])
+        return vectors
 
     def embed_query(self, text: str) -> List[float]:
-        
-        with torch.no_grad():
-            return self.model.encode([text])[0].tolist()
+        return self._encode([text])[0].tolist()
+
+
+def cosine_agreement(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each row of a with the same row of b."""
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return (a * b).sum(axis=1) / np.maximum(norms, 1e-12)
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_embedding_model() -> EmbeddingModel:
+    """Process-wide model, loaded on first use (thread safe)."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = EmbeddingModel(MODEL_NAME)
+    return _model
+
+def warm_up(background: bool = False):
+    """Loads the model ahead of the first query. Servers can call this at startup."""
+    if background:
+        thread = threading.Thread(target=get_embedding_model, name="embedder-warm-up", daemon=True)
+        thread.start()
+        return thread
+    return get_embedding_model()
+
+class LazyEmbeddingModel:
+    """Stands in for the model until something actually embeds (CHAT/PROJECT queries never do)."""
+
+    @property
+    def dim(self) -> int:
+        return get_embedding_model().dim
+
+    @property
+    def inference(self) -> str:
+        """The mode the model runs in, "torch" when the configured one was not kept."""
+        return get_embedding_model().inference
+
+    def embed_documents(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        return get_embedding_model().embed_documents(texts, batch_size)
+
+    def embed_query(self, text: str) -> List[float]:
+        return get_embedding_model().embed_query(text)
 
-shared_embeddings = EmbeddingModel()
\ No newline at end of file
+shared_embeddings = LazyEmbeddingModel()
\ No newline at end of file
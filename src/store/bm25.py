@@ -1,9 +1,12 @@
 import json
-import pickle
 import os
 import ast
-from rank_bm25 import BM25Okapi
 from src.config import *
+from src.ingestion.graph_format import SemanticGraphReader
+from src.store.bm25_index import FORMAT_VERSION
+from src.store.bm25_segments import BM25SegmentStore
+from src.store.tokenizer import tokenize, TOKENIZER_VERSION
+from src.store.source_cache import shared_source_cache
 
 class BM25Builder:
     def __init__(self):
@@ -13,22 +16,15 @@ class BM25Builder:
         self.bm25_index = []
             
     def tokenizer(self, text: str):
-        clean_text = text.replace("_", " ").replace(".", " ").replace("::", " ")
-        clean_text = clean_text.replace("(", " ").replace(")", " ").replace("=", " ")
-        clean_text = clean_text.replace("[", " ").replace("]", " ").replace("{", " ").replace("}", " ")
-        clean_text = clean_text.replace("/", " ").replace("\\", " ")
-    
-        tokenized = clean_text.lower().split()
-        return tokenized
+        #shared with the query side (retriver), see src/store/tokenizer.py
+        return tokenize(text)
     
     def read_the_code(self, path: str, start_line, end_line):
         if os.path.exists(path):
             try:
-                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                    start = max(0, start_line - 1) 
-                    end = end_line
-                    return "".join(lines[start:end])
+                start = max(0, start_line - 1) 
+                end = end_line
+                return shared_source_cache.read_text(path, start, end)
             except Exception as e:
                 print(f"[BM25] => Error reading {path}: {e}")
                 return ""
@@ -61,6 +57,35 @@ class BM25Builder:
         except:
             return code_content 
 
+    def split_signature(self, code_content):
+        """(def/class header up to its colon, rest of the code)."""
+        lines = code_content.splitlines(keepends=True)
+        for i, line in enumerate(lines[:BM25_SIGNATURE_MAX_LINES]):
+            if line.split("#", 1)[0].rstrip().endswith(":"):
+                return "".join(lines[:i + 1]), "".join(lines[i + 1:])
+        return "".join(lines[:1]), "".join(lines[1:])
+
+    def document_fields(self, node, code_content):
+        """BM25F fields of a node: id (node id, name), signature, docstring, body."""
+        identity = f"{node['id']} {node.get('label', '')} "
+        if node["type"] == "module":
+            identity += f"{node['file']} {node.get('name', '')}"
+            signature, body = "", self.get_skeleton_code(code_content)
+        else:
+            signature, body = self.split_signature(code_content)
+            extras = list(node.get("decorators") or []) + list(node.get("bases") or [])
+            if node.get("return_type") and node["return_type"] != "Unknown":
+                extras.append(node["return_type"])
+            signature += " " + " ".join(map(str, extras))
+        
+        fields = {
+            "id": identity,
+            "signature": signature,
+            "docstring": node.get("docstring") or "",
+            "body": body
+        }
+        return {field: self.tokenizer(text) for field, text in fields.items()}
+
     def build(self):
         print(f"[BM25] => Starting Index Build...")
 
@@ -68,16 +93,17 @@ class BM25Builder:
             print(f"[BM25] => Input graph file missing at {INPUT_FILE}")
             return
 
-        with open(INPUT_FILE, 'r') as f:
-            data = json.load(f)
-        
-        corpus = []
-        node_ids = []
-        
-        for node in data['nodes']:
+        with SemanticGraphReader(INPUT_FILE) as graph:
+            self.index_nodes(graph)
+
+    def iter_documents(self, graph, files=None):
+        """(node id, file, fields) of every indexable node, only those of `files` if given."""
+        for node in graph.iter_nodes():
             
             if node["type"] not in ["function", "class", "module"]:
                 continue            
+            if files is not None and node['file'] not in files:
+                continue
             
             full_path = os.path.join(REPO_PATH, node['file'])
             
@@ -87,45 +113,37 @@ class BM25Builder:
                 node['end']
             )
             
+            #separate fields so a long body cannot drown an exact name match
+            fields = self.document_fields(node, code_content)
             
-            if node["type"] == "module":
-                final_content = self.get_skeleton_code(code_content)
-                
-                docx_text = f"FILE: {node['file']} MODULE GLOBAL "
-            else:
-                final_content = code_content
-                docx_text = f"{node['type']} "
-
-            docx_text += f"{node['id']} {node.get('label', '')} "
-            
-            if node.get("docstring"):
-                docx_text += f"{node['docstring']} "
-            
-            if node.get("args"): 
-                docx_text += f"{node['args']} "
+            if any(fields.values()):
+                yield node["id"], node['file'], fields
 
-            docx_text += f" {final_content}"
-                    
-            tokens = self.tokenizer(docx_text)
-            
-            if tokens:
-                corpus.append(tokens)
-                node_ids.append(node["id"])
-                
-        if not corpus:
-            print('[BM25] => No indexable content found')
-            return
-            
-        
-        bm25_model = BM25Okapi(corpus)
+    def index_nodes(self, graph):
+        file_hashes = graph.files
+        build = f"{TOKENIZER_VERSION}/{FORMAT_VERSION}"
+        store = BM25SegmentStore(BM25_OUTPUT_FILE, BM25_BUILD_MEMORY_MB)
+        manifest = store.manifest()
         
-        package = {
-            "model": bm25_model,
-            "node_map": node_ids
-        }
+        #postings are inverted in memory up to the budget, then spilled as sorted runs and merged
+        if manifest is None or manifest.get("build") != build:
+            print(f"[BM25] => Full build into {BM25_OUTPUT_FILE}...")
+            count = store.replace(self.iter_documents(graph), build, file_hashes)
+            print(f"[BM25] => Indexed {count} nodes (Functions, Classes, Globals).")
+            return
         
-        print(f"[BM25] => Indexed {len(node_ids)} nodes (Functions, Classes, Globals).")
-        print(f"[BM25] => Saving index to {BM25_OUTPUT_FILE}...")
+        #same tokenizer and layout: only the files whose hash changed (or that are gone)
+        indexed = manifest.get("file_hashes", {})
+        changed = {f for f, h in file_hashes.items() if not h or indexed.get(f) != h}
+        changed |= set(indexed) - set(file_hashes)
+        if not changed:
+            print("[BM25] => No file changed since the last build")
+            return
         
-        with open(BM25_OUTPUT_FILE, "wb") as f:
-            pickle.dump(package, f)
\ No newline at end of file
+        count = store.update(self.iter_documents(graph, changed), changed, file_hashes)
+        print(f"[BM25] => {len(changed)} changed files: new segment of {count} nodes, older copies tombstoned.")
+
+
+def build_bm25_index():
+    """Entry point for building the index in a worker process."""
+    BM25Builder().build()
@@ -0,0 +1,768 @@
+import os
+import json
+import math
+import heapq
+import struct
+import shutil
+import itertools
+import numpy as np
+from array import array
+from operator import itemgetter
+from src.config import BM25_PRUNE_MIN_DOCS
+
+# Inverted index replacing the pickled BM25Okapi, scored as BM25F.
+#
+# Every document has the fields of FIELDS (node id / name, signature, docstring, body),
+# tokenized separately. One directory of .npy files, opened with mmap_mode="r":
+#   terms.offsets / terms.blob      sorted vocabulary (utf-8 string table)
+#   postings.indptr                 term i owns postings[indptr[i]:indptr[i+1]]
+#   postings.docs                   doc numbers (ascending)
+#   postings.tf.<field>             term frequency in that field
+#   df                              documents per term (idf is derived at query time)
+#   doc_len.<field>                 tokens per document in that field
+#   nodes.offsets / nodes.blob      node id of every document
+#   ranges.* / terms.*              block-max table, see below
+#   meta.json                       fields, field length totals, document count
+#
+# BM25F: each field frequency is length-normalized on its own (b per field), weighted,
+# and the sum is saturated once with k1. Weights, b and k1 are query arguments, only
+# raw frequencies and lengths are stored, so tuning them needs no rebuild. idf is
+# Lucene's log(1 + (N - df + 0.5) / (df + 0.5)): never negative and a function of N and
+# df alone, so several indexes (segments, see bm25_segments.py) can be scored with
+# their combined statistics (CollectionStats) exactly as one index would be.
+#
+# Pruning: documents are cut into ranges of RANGE_DOCS consecutive numbers. For every
+# (term, range) with postings the table keeps, per field, the largest tf and the
+# shortest field length among the postings (terms.* the same over all ranges). A
+# query turns them into upper bounds with its own weights; top_k_pruned uses those to
+# skip postings and documents that cannot reach the k-th score, the result is exactly
+# the exhaustive top k. Below BM25_PRUNE_MIN_DOCS documents the bookkeeping costs more
+# than the postings it skips, so top_k scores small indexes exhaustively.
+#
+# Build (BM25IndexWriter, SPIMI style): documents are inverted in memory until the
+# memory budget is reached, then that batch is written as a run of postings sorted by
+# term. Closing the writer merges the runs (doc numbers ascend from run to run, so a
+# term's postings are its runs' postings concatenated) and streams every array to disk.
+# Memory stays within the budget whatever the corpus size, except that one term's
+# postings are held whole during the merge (about 20 bytes per document containing it).
+# add_index() feeds the live documents of existing indexes through the same merge.
+
+FORMAT_VERSION = 4
+
+FIELDS = ["id", "signature", "docstring", "body"]
+
+K1 = 1.5
+B = 0.75
+RANGE_DOCS = 512
+
+NO_LENGTH = np.iinfo(np.int32).max  # min_len of a field the term never occurs in
+MIN_NORM = 1e-12
+BOUND_SLACK = 1 + 1e-9  # bounds are recomputed per query, keep them above float rounding
+
+MEMORY_MB = 256
+RUN_HEADER = struct.Struct("<II")  # term length in bytes, postings
+POSTING_BYTES = 4 * (1 + len(FIELDS))  # doc number + per-field tfs, in a run buffer
+TERM_BYTES = 320  # a new term in a run buffer: dict slot, str and two arrays
+MERGE_POSTING_BYTES = 128  # per posting while a merged batch gets its range table
+
+
+def field_params(weights=None, b=None, k1=None):
+    """
+    Query-time BM25F parameters as (weights, b) arrays in FIELDS order and k1. Fields
+    left out get weight 1 and B; b may also be one number for every field.
+    """
+    weights = weights or {}
+    if not isinstance(b, dict):
+        b = dict.fromkeys(FIELDS, B if b is None else b)
+    unknown = (set(weights) | set(b)) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown BM25F fields {sorted(unknown)}, expected {FIELDS}")
+
+    weight_values = np.array([float(weights.get(f, 1.0)) for f in FIELDS])
+    b_values = np.array([float(b.get(f, B)) for f in FIELDS])
+    k1 = K1 if k1 is None else float(k1)
+    if (weight_values < 0).any() or (b_values < 0).any() or (b_values > 1).any() or k1 <= 0:
+        raise ValueError("BM25F needs weights >= 0, 0 <= b <= 1 and k1 > 0")
+    return weight_values, b_values, k1
+
+
+def write_bm25_index(docs, node_ids, path, memory_mb=MEMORY_MB):
+    """Builds the index for documents given as {field: tokens} (one per node id) into the `path` directory."""
+    with BM25IndexWriter(path, memory_mb) as writer:
+        for node_id, fields in zip(node_ids, docs):
+            writer.add(node_id, fields)
+
+
+class _Column:
+    """Append-only array spilled to a raw file, saved as .npy once its length is known."""
+    def __init__(self, path, dtype, buffer_bytes=1 << 20):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.buffer_bytes = buffer_bytes
+        self._pending = []
+        self._pending_bytes = 0
+        self._file = open(path, "wb")
+
+    def append(self, values):
+        values = np.asarray(values, dtype=self.dtype)
+        self._pending.append(values)
+        self.count += len(values)
+        self._pending_bytes += values.nbytes
+        if self._pending_bytes >= self.buffer_bytes:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._file.write(np.concatenate(self._pending).tobytes())
+            self._pending = []
+            self._pending_bytes = 0
+
+    def view(self):
+        """Read-only mapping of what was appended so far."""
+        self.flush()
+        self._file.flush()
+        if not self.count:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.count,))
+
+    def save(self, npy_path):
+        """.npy header + the raw bytes, then the raw file is dropped."""
+        self.flush()
+        self._file.close()
+        header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": (self.count,)}
+        with open(npy_path, "wb") as out, open(self.path, "rb") as raw:
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(raw, out, 1 << 20)
+        os.remove(self.path)
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _read_index(index, remap):
+    """(term, new docs, per-field tfs) records of an existing index, dropped docs left out."""
+    for t in range(len(index.df)):
+        start, end = index.indptr[t], index.indptr[t + 1]
+        docs = remap[index.docs[start:end]]
+        keep = docs >= 0
+        if not keep.any():
+            continue
+        tfs = np.stack([tf[start:end][keep] for tf in index.tfs], axis=1)
+        yield index.term(t), docs[keep].astype("<i4"), tfs
+
+
+def _read_run(path, buffer_size):
+    """(term, docs, per-field tfs) records of one run, in term order."""
+    field_count = len(FIELDS)
+    with open(path, "rb", buffering=buffer_size) as f:
+        while True:
+            header = f.read(RUN_HEADER.size)
+            if not header:
+                return
+            key_length, count = RUN_HEADER.unpack(header)
+            term = f.read(key_length).decode("utf-8", errors="surrogatepass")
+            docs = np.frombuffer(f.read(4 * count), dtype="<i4")
+            tfs = np.frombuffer(f.read(4 * count * field_count), dtype="<i4").reshape(count, field_count)
+            yield term, docs, tfs
+
+
+class BM25IndexWriter:
+    """
+    Streaming build of the index in `path`: add() documents one at a time, close()
+    merges the sorted runs and swaps the new index in. Runs and raw columns live in
+    `path`.tmp until then.
+    """
+    def __init__(self, path, memory_mb=MEMORY_MB):
+        self.path = path
+        self.budget = max(int(memory_mb * 2**20), 2**20)
+        self.tmp_path = path + ".tmp"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(os.path.join(self.tmp_path, "runs"))
+
+        self.doc_count = 0
+        self.posting_count = 0
+        self.field_totals = [0] * len(FIELDS)
+        self.runs = []
+        self.sources = []  # runs and added indexes, in doc number order
+        self.closed = False
+
+        self._known = set(FIELDS)
+        self._run = {}  # term -> (doc numbers, per-field tfs interleaved)
+        self._run_bytes = 0
+        self._lengths = [array("i") for _ in FIELDS]
+        self._node_ends = array("q")
+        self._node_blob = bytearray()
+        self._node_bytes = 0
+
+        self.columns = {}
+        for field in FIELDS:
+            self._column(f"doc_len.{field}", "<i4")
+        self._column("nodes.offsets", "<i8").append([0])
+        self._column("nodes.blob", "u1")
+
+    def _column(self, name, dtype):
+        #about 30 columns are open while merging, their write buffers come out of the budget too
+        buffer_bytes = min(1 << 20, self.budget // 64)
+        self.columns[name] = column = _Column(os.path.join(self.tmp_path, f"{name}.raw"), dtype, buffer_bytes)
+        return column
+
+    def add(self, node_id, fields):
+        """Inverts one document ({field: tokens}), spilling a run when the budget is reached."""
+        if self.closed:
+            raise ValueError("BM25IndexWriter is closed")
+        if not self._known.issuperset(fields):
+            raise ValueError(f"Unknown BM25F fields {sorted(set(fields) - self._known)}, expected {FIELDS}")
+
+        field_count = len(FIELDS)
+        frequencies = {}
+        for f, field in enumerate(FIELDS):
+            tokens = fields.get(field) or ()
+            self._lengths[f].append(len(tokens))
+            self.field_totals[f] += len(tokens)
+            for token in tokens:
+                counts = frequencies.get(token)
+                if counts is None:
+                    frequencies[token] = counts = [0] * field_count
+                counts[f] += 1
+
+        doc = self.doc_count
+        run = self._run
+        for term, counts in frequencies.items():
+            entry = run.get(term)
+            if entry is None:
+                run[term] = entry = (array("i"), array("i"))
+                self._run_bytes += TERM_BYTES + len(term)
+            entry[0].append(doc)
+            entry[1].extend(counts)
+
+        key = node_id.encode("utf-8", errors="surrogatepass")
+        self._node_blob += key
+        self._node_bytes += len(key)
+        self._node_ends.append(self._node_bytes)
+
+        self._run_bytes += len(frequencies) * POSTING_BYTES + len(key) + 8 + 4 * field_count
+        self.doc_count += 1
+        self.posting_count += len(frequencies)
+        if self._run_bytes >= self.budget:
+            self._flush_run()
+            print(f"[BM25] => Spilled run {len(self.runs)} ({self.doc_count} docs so far)")
+
+    def _flush_run(self):
+        """Writes the in-memory postings as one run sorted by term, plus the per-document columns."""
+        for f, field in enumerate(FIELDS):
+            self.columns[f"doc_len.{field}"].append(np.frombuffer(self._lengths[f], dtype=np.int32))
+            self._lengths[f] = array("i")
+        self.columns["nodes.offsets"].append(np.frombuffer(self._node_ends, dtype=np.int64))
+        self.columns["nodes.blob"].append(np.frombuffer(bytes(self._node_blob), dtype="u1"))
+        self._node_ends = array("q")
+        self._node_blob = bytearray()
+
+        if self._run:
+            run_path = os.path.join(self.tmp_path, "runs", f"{len(self.runs):06d}.run")
+            with open(run_path, "wb", buffering=1 << 20) as f:
+                for term in sorted(self._run):
+                    docs, tfs = self._run[term]
+                    key = term.encode("utf-8", errors="surrogatepass")
+                    f.write(RUN_HEADER.pack(len(key), len(docs)))
+                    f.write(key)
+                    f.write(docs.tobytes())
+                    f.write(tfs.tobytes())
+            self.runs.append(run_path)
+            self.sources.append(run_path)
+        self._run = {}
+        self._run_bytes = 0
+
+    def add_index(self, index, deleted=None):
+        """
+        Appends the documents of an existing BM25Index, minus the `deleted` doc numbers;
+        their postings are merged at close. Returns the old -> new doc number map (-1: dropped).
+        """
+        if self.closed:
+            raise ValueError("BM25IndexWriter is closed")
+        self._flush_run()  # what was add()ed so far comes first
+
+        alive = np.ones(index.doc_count, dtype=bool)
+        if deleted is not None and len(deleted):
+            alive[np.asarray(deleted)] = False
+        live = int(alive.sum())
+        remap = np.full(index.doc_count, -1, dtype=np.int64)
+        remap[alive] = self.doc_count + np.arange(live)
+
+        for f, field in enumerate(FIELDS):
+            lengths = index.doc_len[f][alive]
+            self.columns[f"doc_len.{field}"].append(lengths)
+            self.field_totals[f] += int(lengths.sum())
+
+        lengths = np.diff(index.node_offsets)
+        kept = lengths[alive]
+        self.columns["nodes.offsets"].append(self._node_bytes + np.cumsum(kept))
+        self.columns["nodes.blob"].append(index.node_blob[np.repeat(alive, lengths)])
+        self._node_bytes += int(kept.sum())
+
+        self.sources.append((index, remap))
+        self.doc_count += live
+        return remap
+
+    def close(self):
+        """Merges the runs into the final arrays and publishes the index (replacing the old one)."""
+        if self.closed:
+            return
+        self._flush_run()
+        self.closed = True
+        try:
+            self._merge()
+        except BaseException:
+            self.abort()
+            raise
+        _swap(self.tmp_path, self.path)
+
+    def abort(self):
+        """Drops everything written so far, the published index is left untouched."""
+        self.closed = True
+        for column in self.columns.values():
+            column.discard()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _merge(self):
+        for field in FIELDS:
+            self.columns[f"doc_len.{field}"].save(os.path.join(self.tmp_path, f"doc_len.{field}.npy"))
+        for name in ["nodes.offsets", "nodes.blob"]:
+            self.columns[name].save(os.path.join(self.tmp_path, f"{name}.npy"))
+        doc_len = [np.load(os.path.join(self.tmp_path, f"doc_len.{field}.npy"), mmap_mode="r") for field in FIELDS]
+
+        self._column("postings.indptr", "<i8").append([0])
+        self._column("postings.docs", "<i4")
+        self._column("df", "<i8")
+        self._column("terms.offsets", "<i8").append([0])
+        self._column("terms.blob", "u1")
+        self._column("ranges.indptr", "<i8").append([0])
+        self._column("ranges.id", "<i4")
+        for field in FIELDS:
+            for name in [f"postings.tf.{field}", f"ranges.max_tf.{field}", f"ranges.min_len.{field}", f"terms.max_tf.{field}", f"terms.min_len.{field}"]:
+                self._column(name, "<i4")
+
+        #k-way merge; equal terms come out in source order, i.e. ascending doc numbers
+        buffer_size = max(min(1 << 20, self.budget // (4 * max(len(self.runs), 1))), 1 << 12)
+        readers = [_read_run(source, buffer_size) if isinstance(source, str) else _read_index(*source) for source in self.sources]
+        records = heapq.merge(*readers, key=itemgetter(0))
+        batch_limit = max(self.budget // MERGE_POSTING_BYTES, 1)
+        batch, batch_postings = [], 0
+        self._written = {"postings": 0, "ranges": 0, "term_bytes": 0}
+        for term, group in itertools.groupby(records, key=itemgetter(0)):
+            parts = list(group)
+            if len(parts) == 1:
+                docs, tfs = parts[0][1], parts[0][2]
+            else:
+                docs = np.concatenate([part[1] for part in parts])
+                tfs = np.concatenate([part[2] for part in parts])
+            batch.append((term, docs, tfs))
+            batch_postings += len(docs)
+            if batch_postings >= batch_limit:
+                self._write_batch(batch, doc_len)
+                batch, batch_postings = [], 0
+        if batch:
+            self._write_batch(batch, doc_len)
+        del doc_len
+
+        for name, column in list(self.columns.items()):
+            if name.startswith(("doc_len.", "nodes.")):
+                continue
+            column.save(os.path.join(self.tmp_path, f"{name}.npy"))
+        shutil.rmtree(os.path.join(self.tmp_path, "runs"), ignore_errors=True)
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "fields": FIELDS,
+            "range_docs": RANGE_DOCS,
+            "doc_count": self.doc_count,
+            "field_totals": dict(zip(FIELDS, self.field_totals))
+        }
+        with open(os.path.join(self.tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def _write_batch(self, batch, doc_len):
+        """Postings, vocabulary and block-max rows of a batch of merged terms."""
+        columns, written = self.columns, self._written
+        counts = np.array([len(docs) for _, docs, _ in batch], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        docs = np.concatenate([docs for _, docs, _ in batch])
+        tfs = np.concatenate([tfs for _, _, tfs in batch])
+
+        arrays = {"postings.indptr": indptr, "postings.docs": docs}
+        for f, field in enumerate(FIELDS):
+            arrays[f"postings.tf.{field}"] = np.ascontiguousarray(tfs[:, f])
+            arrays[f"doc_len.{field}"] = doc_len[f]
+        table = _range_maxima(arrays, {"range_docs": RANGE_DOCS})
+
+        columns["postings.indptr"].append(written["postings"] + indptr[1:])
+        columns["postings.docs"].append(docs)
+        columns["df"].append(counts)
+        columns["ranges.indptr"].append(written["ranges"] + table["ranges.indptr"][1:])
+        columns["ranges.id"].append(table["ranges.id"])
+        for field in FIELDS:
+            columns[f"postings.tf.{field}"].append(arrays[f"postings.tf.{field}"])
+            for name in [f"ranges.max_tf.{field}", f"ranges.min_len.{field}", f"terms.max_tf.{field}", f"terms.min_len.{field}"]:
+                columns[name].append(table[name])
+
+        keys = [term.encode("utf-8", errors="surrogatepass") for term, _, _ in batch]
+        ends = written["term_bytes"] + np.cumsum([len(key) for key in keys])
+        columns["terms.offsets"].append(ends)
+        columns["terms.blob"].append(np.frombuffer(b"".join(keys), dtype="u1"))
+
+        written["postings"] += len(docs)
+        written["ranges"] += len(table["ranges.id"])
+        written["term_bytes"] = int(ends[-1])
+
+
+def pseudo_tf(tfs, lens, avg_len, weights, b):
+    """BM25F frequency: per field tf / (1 - b + b * len / avg_len), weighted and summed (one entry per field)."""
+    total = 0.0
+    for tf, dl, avg, w, bf in zip(tfs, lens, avg_len, weights, b):
+        total = total + w * tf / np.maximum(1 - bf + bf * dl / avg, MIN_NORM)
+    return total
+
+
+def term_scores(idf, tf, k1):
+    """Score a term adds for a (pseudo) frequency, the BM25 saturation kept in one place."""
+    return idf * (tf * (k1 + 1) / (tf + k1))
+
+
+def _range_maxima(arrays, meta):
+    """Block-max table: per term, the doc ranges it occurs in and, per field, the largest tf and shortest length there."""
+    indptr, docs = arrays["postings.indptr"], arrays["postings.docs"]
+    term_count = len(indptr) - 1
+
+    posting_terms = np.repeat(np.arange(term_count), np.diff(indptr))
+    ranges = docs // meta["range_docs"]
+
+    #postings are sorted by term, then doc: each (term, range) is one contiguous run
+    new_run = np.ones(len(docs), dtype=bool)
+    new_run[1:] = (posting_terms[1:] != posting_terms[:-1]) | (ranges[1:] != ranges[:-1])
+    starts = np.flatnonzero(new_run)
+    range_indptr = np.searchsorted(posting_terms[starts], np.arange(term_count + 1))
+
+    table = {
+        "ranges.indptr": range_indptr.astype("<i8"),
+        "ranges.id": ranges[starts].astype("<i4"),
+    }
+    for field in FIELDS:
+        tfs = arrays[f"postings.tf.{field}"]
+        #only postings that use the field may shorten its length bound
+        lens = np.where(tfs > 0, arrays[f"doc_len.{field}"][docs], NO_LENGTH).astype("<i4")
+        if len(starts):
+            range_tf, range_len = np.maximum.reduceat(tfs, starts), np.minimum.reduceat(lens, starts)
+            term_tf, term_len = np.maximum.reduceat(range_tf, range_indptr[:-1]), np.minimum.reduceat(range_len, range_indptr[:-1])
+        else:
+            range_tf = range_len = term_tf = term_len = np.empty(0, dtype="<i4")
+        table[f"ranges.max_tf.{field}"], table[f"ranges.min_len.{field}"] = range_tf.astype("<i4"), range_len.astype("<i4")
+        table[f"terms.max_tf.{field}"], table[f"terms.min_len.{field}"] = term_tf.astype("<i4"), term_len.astype("<i4")
+    return table
+
+
+def _swap(tmp_path, path):
+    """Swaps a fully written sibling directory in, readers never see half an index."""
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def bm25_idf(doc_count, df):
+    """Lucene's BM25 idf, positive for any df and composable across segments."""
+    return math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+
+class CollectionStats:
+    """
+    What scoring needs beyond the postings: live document count, average field lengths
+    and the document frequency of a token (doc_freq(token) -> int). An index is scored
+    with its own (BM25Index.stats) unless it is one segment of several.
+    """
+    def __init__(self, doc_count, avg_len, doc_freq, cache_size=100000):
+        self.doc_count = doc_count
+        self.avg_len = np.asarray(avg_len, dtype=float)
+        self.doc_freq = doc_freq
+        self.cache_size = cache_size
+        self._idf = {}
+
+    def idf(self, token):
+        """idf of a token, 0 if no live document has it."""
+        value = self._idf.get(token)
+        if value is None:
+            df = self.doc_freq(token)
+            value = bm25_idf(self.doc_count, df) if df else 0.0
+            if len(self._idf) < self.cache_size:
+                self._idf[token] = value
+        return value
+
+
+def _without(docs, deleted):
+    """Sorted docs minus the sorted deleted doc numbers."""
+    if deleted is None or not len(deleted) or not len(docs):
+        return docs
+    pos = np.searchsorted(deleted, docs)
+    pos[pos == len(deleted)] = 0
+    return docs[deleted[pos] != docs]
+
+
+class BM25Index:
+    """Read side of BM25IndexWriter. Arrays stay on disk (memory-mapped) until a query touches them."""
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path} is an old BM25 index, rebuild it (v{FORMAT_VERSION})")
+        if meta.get("fields") != FIELDS:
+            raise ValueError(f"{path} has fields {meta.get('fields')}, expected {FIELDS}")
+        self.doc_count = meta["doc_count"]
+        self.field_totals = np.array([meta["field_totals"][f] for f in FIELDS], dtype=np.int64)
+        self.avg_len = self.field_totals / self.doc_count if self.doc_count else np.zeros(len(FIELDS))
+        self.range_docs = meta["range_docs"]
+
+        def load(name):
+            #plain ndarray view of the mapping: np.memmap slicing costs more than the small gathers it serves
+            return np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+        self.indptr = load("postings.indptr")
+        self.docs = load("postings.docs")
+        self.tfs = [load(f"postings.tf.{f}") for f in FIELDS]
+        self.df = load("df")
+        self.doc_len = [load(f"doc_len.{f}") for f in FIELDS]
+        self.term_offsets, self.term_blob = load("terms.offsets"), load("terms.blob")
+        self.node_offsets, self.node_blob = load("nodes.offsets"), load("nodes.blob")
+        self.range_indptr, self.range_id = load("ranges.indptr"), load("ranges.id")
+        self.range_max_tf = [load(f"ranges.max_tf.{f}") for f in FIELDS]
+        self.range_min_len = [load(f"ranges.min_len.{f}") for f in FIELDS]
+        self.term_max_tf = [load(f"terms.max_tf.{f}") for f in FIELDS]
+        self.term_min_len = [load(f"terms.min_len.{f}") for f in FIELDS]
+        self._terms = {}
+        self.stats = CollectionStats(self.doc_count, self.avg_len, self.term_df)
+
+    def __len__(self):
+        return self.doc_count
+
+    def term(self, i):
+        return self.term_blob[self.term_offsets[i]:self.term_offsets[i + 1]].tobytes().decode("utf-8", errors="surrogatepass")
+
+    def term_id(self, term):
+        """Position of a term in the sorted vocabulary, -1 if unknown (binary search)."""
+        i = self._terms.get(term)
+        if i is not None:
+            return i
+        lo, hi = 0, len(self.df)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        i = lo if lo < len(self.df) and self.term(lo) == term else -1
+        if len(self._terms) < 100000:
+            self._terms[term] = i
+        return i
+
+    def term_df(self, term):
+        t = self.term_id(term)
+        return int(self.df[t]) if t >= 0 else 0
+
+    def term_docs(self, term):
+        """Sorted doc numbers containing a term."""
+        t = self.term_id(term)
+        return self._term_docs(t) if t >= 0 else self.docs[:0]
+
+    def node_id(self, doc):
+        return self.node_blob[self.node_offsets[doc]:self.node_offsets[doc + 1]].tobytes().decode("utf-8", errors="surrogatepass")
+
+    def node_ids(self):
+        for doc in range(self.doc_count):
+            yield self.node_id(doc)
+
+    def query_terms(self, query_tokens, stats):
+        """(vocabulary position, idf) of the query tokens that can score here (repeats kept)."""
+        terms = []
+        for token in query_tokens:
+            t = self.term_id(token)
+            if t >= 0:
+                idf = stats.idf(token)
+                if idf > 0:
+                    terms.append((t, idf))
+        return terms
+
+    def params(self, weights=None, b=None, k1=None, stats=None):
+        """field_params plus the fields that can score (positive weight, not empty everywhere) and the average lengths."""
+        weights, b, k1 = field_params(weights, b, k1)
+        avg_len = (stats or self.stats).avg_len
+        fields = [f for f in range(len(FIELDS)) if weights[f] > 0 and avg_len[f] > 0]
+        return fields, weights, b, k1, avg_len
+
+    def _contributions(self, idf, positions, docs, params):
+        """Scores a term adds to docs, `positions` being their postings of it."""
+        fields, weights, b, k1, avg_len = params
+        tf = pseudo_tf(
+            [self.tfs[f][positions] for f in fields],
+            [self.doc_len[f][docs] for f in fields],
+            avg_len[fields], weights[fields], b[fields]
+        )
+        return term_scores(idf, tf, k1)
+
+    def _upper_bound(self, idf, max_tfs, min_lens, params):
+        """Bound on a term's score from per-field tf maxima and length minima (never negative)."""
+        fields, weights, b, k1, avg_len = params
+        tf = pseudo_tf(
+            [max_tfs[f] for f in fields],
+            [min_lens[f] for f in fields],
+            avg_len[fields], weights[fields], b[fields]
+        )
+        return np.maximum(term_scores(idf, tf, k1) * BOUND_SLACK, 0)
+
+    def get_scores(self, query_tokens, weights=None, b=None, k1=None, stats=None, deleted=None):
+        """Dense BM25F scores for every document (0 for the deleted doc numbers)."""
+        stats = stats or self.stats
+        params = self.params(weights, b, k1, stats)
+        scores = np.zeros(self.doc_count)
+        for t, idf in self.query_terms(query_tokens, stats):
+            start, end = self.indptr[t], self.indptr[t + 1]
+            docs = self.docs[start:end]
+            scores[docs] += self._contributions(idf, slice(start, end), docs, params)
+        if deleted is not None and len(deleted):
+            scores[deleted] = 0
+        return scores
+
+    @staticmethod
+    def _best(docs, scores, k):
+        """
+        The k best (doc, score) pairs, ties broken by the lower document (like a stable
+        sort), positive scores only.
+        """
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        if k < len(scores):
+            #kth best value, then everything at least that good (ties included)
+            kth = scores[np.argpartition(-scores, k - 1)[:k]].min()
+            keep = np.flatnonzero(scores >= kth)
+            docs, scores = docs[keep], scores[keep]
+
+        order = np.lexsort((docs, -scores))[:k]
+        docs, scores = docs[order], scores[order]
+        positive = scores > 0
+        return docs[positive], scores[positive]
+
+    def top_k_exhaustive(self, query_tokens, k, weights=None, b=None, k1=None, stats=None, deleted=None):
+        """Top k over the dense score vector of every document. Returns (docs, scores)."""
+        scores = self.get_scores(query_tokens, weights, b, k1, stats, deleted)
+        return self._best(np.arange(len(scores)), scores, k)
+
+    def _term_docs(self, t):
+        return self.docs[self.indptr[t]:self.indptr[t + 1]]
+
+    def _lookup(self, t, idf, candidates, params):
+        """Scores term t adds to sorted candidate docs (positions that contain it, contributions)."""
+        docs = self._term_docs(t)
+        pos = np.searchsorted(docs, candidates)
+        pos[pos == len(docs)] = 0
+        found = np.flatnonzero(docs[pos] == candidates) if len(docs) else np.empty(0, dtype=np.int64)
+        return found, self._contributions(idf, self.indptr[t] + pos[found], candidates[found], params)
+
+    def _score_candidates(self, terms, candidates, params):
+        """Exact scores of sorted candidate docs (term order kept, so the sums match get_scores)."""
+        scores = np.zeros(len(candidates))
+        for t, idf in terms:
+            found, contribution = self._lookup(t, idf, candidates, params)
+            scores[found] += contribution
+        return scores
+
+    def top_k(self, query_tokens, k, weights=None, b=None, k1=None, stats=None, deleted=None):
+        """Top k documents (docs, scores): pruned on large indexes, exhaustive below BM25_PRUNE_MIN_DOCS."""
+        score = self.top_k_pruned if self.doc_count >= BM25_PRUNE_MIN_DOCS else self.top_k_exhaustive
+        return score(query_tokens, k, weights, b, k1, stats, deleted)
+
+    def top_k_pruned(self, query_tokens, k, weights=None, b=None, k1=None, stats=None, deleted=None):
+        """
+        Same result as top_k_exhaustive without reading every posting (MaxScore with block-max bounds):
+
+        1. the rarest terms' documents are scored exactly, their k-th score is a threshold
+           the real k-th score can only beat;
+        2. the most common terms whose upper bounds add up to less than that threshold are
+           "non-essential": a document containing only them cannot make the top k, so their
+           (long) postings are never scanned, only looked up for candidates;
+        3. candidates are the postings of the other terms, minus documents whose range bound
+           is below the threshold.
+
+        `stats` scores this index as part of a larger collection, `deleted` (sorted doc
+        numbers) are never returned.
+        """
+        stats = stats or self.stats
+        params = self.params(weights, b, k1, stats)
+        terms = self.query_terms(query_tokens, stats)
+        if not terms or not params[0] or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        idf = dict(terms)
+        lengths = {t: self.indptr[t + 1] - self.indptr[t] for t in idf}
+
+        #1. threshold from the shortest posting lists
+        seeds = []
+        for t in sorted(idf, key=lambda t: lengths[t]):
+            seeds.append(self._term_docs(t))
+            if sum(map(len, seeds)) >= k:
+                break
+        seeds = _without(np.unique(np.concatenate(seeds)), deleted)
+        seed_scores = self._score_candidates(terms, seeds, params)
+        seed_docs, seed_scores = self._best(seeds, seed_scores, k)
+        threshold = seed_scores[-1] if len(seed_docs) == k else 0.0
+
+        #2. non-essential terms, most common (lowest bound) first; bounds added in query order
+        term_max = {
+            t: self._upper_bound(idf[t], [m[t] for m in self.term_max_tf], [m[t] for m in self.term_min_len], params)
+            for t in idf
+        }
+        non_essential = set()
+        for t in sorted(term_max, key=lambda t: term_max[t]):
+            trial = non_essential | {t}
+            bound = 0.0
+            for q, _ in terms:
+                if q in trial:
+                    bound += term_max[q]
+            if not bound < threshold:
+                break
+            non_essential = trial
+
+        #3. candidates, filtered by the per-range bounds (also added in query order)
+        range_count = -(-self.doc_count // self.range_docs)
+        bounds = np.zeros(range_count)
+        for t, term_idf in terms:
+            a, z = self.range_indptr[t], self.range_indptr[t + 1]
+            bounds[self.range_id[a:z]] += self._upper_bound(
+                term_idf, [m[a:z] for m in self.range_max_tf], [m[a:z] for m in self.range_min_len], params
+            )
+
+        essential = [t for t in idf if t not in non_essential]
+        candidates = np.unique(np.concatenate([seed_docs] + [self._term_docs(t) for t in essential]))
+        candidates = _without(candidates, deleted)
+        bound = bounds[candidates // self.range_docs]
+        candidates = candidates[(bound > 0) & (bound >= threshold)]
+
+        scores = self._score_candidates(terms, candidates, params)
+        return self._best(candidates, scores, k)
+
+    def search(self, query_tokens, k, weights=None, b=None, k1=None):
+        """Node ids of the top k documents, weights / b per field and k1 as in field_params."""
+        docs, _ = self.top_k(query_tokens, k, weights, b, k1)
+        return [self.node_id(int(d)) for d in docs]
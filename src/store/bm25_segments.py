@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import numpy as np
+from src.config import BM25_BUILD_MEMORY_MB, BM25_MAX_SEGMENTS, BM25_MERGE_DELETED_RATIO
+from src.store.bm25_index import BM25Index, BM25IndexWriter, CollectionStats, FIELDS, FORMAT_VERSION
+
+# Segmented BM25 store. The BM25 directory holds
+#   manifest.json               live segments (oldest first) with their tombstone file,
+#                               the build version and the file hashes that were indexed
+#   seg_<id>/                   one BM25 index (bm25_index.py) + files.json: doc numbers per source file
+#   seg_<id>/deleted.<gen>.npy  tombstones: sorted doc numbers no longer live in that segment
+#
+# A build that finds the same build version only indexes the files whose hash changed
+# into a new segment, and tombstones every live doc of the changed or removed files in
+# the older ones. Segments are never modified; the manifest is replaced atomically
+# under a lock file (builds run in a worker process, merges in the server), so readers
+# see either the old or the new set. What a commit drops is deleted one commit later,
+# once nobody opens it any more.
+#
+# Scoring uses the live totals of all segments (document count, field lengths, document
+# frequencies minus tombstoned docs), so a document scores as it would in one index.
+#
+# Merging rewrites the smallest segments (past BM25_MAX_SEGMENTS) and the ones with too
+# many tombstones as one segment without the deleted docs, on a background thread.
+
+MANIFEST = "manifest.json"
+LOCK = "manifest.lock"
+LOCK_STALE_SECONDS = 600
+
+
+class ManifestLock:
+    """Lock file around manifest updates, works across processes."""
+    def __init__(self, path):
+        self.path = os.path.join(path, LOCK)
+
+    def __enter__(self):
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    #a crashed writer never releases it
+                    if time.time() - os.path.getmtime(self.path) > LOCK_STALE_SECONDS:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def read_manifest(path):
+    """The store's manifest, None if there is no store (or one of another format) at path."""
+    try:
+        with open(os.path.join(path, MANIFEST), "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, NotADirectoryError, ValueError):
+        return None
+    return manifest if manifest.get("format") == FORMAT_VERSION else None
+
+
+def _count_in(sorted_values, docs):
+    """How many of the sorted values are in the sorted docs."""
+    if not len(sorted_values) or not len(docs):
+        return 0
+    pos = np.searchsorted(docs, sorted_values)
+    pos[pos == len(docs)] = 0
+    return int((docs[pos] == sorted_values).sum())
+
+
+class SegmentedBM25:
+    """Read side: every live segment of the manifest, scored with the collection totals."""
+    def __init__(self, path):
+        self.path = path
+        manifest = read_manifest(path)
+        if manifest is None:
+            raise FileNotFoundError(f"No BM25 segments in {path}")
+        self.generation = manifest["generation"]
+
+        self.segments = []  # (BM25Index, sorted tombstoned doc numbers)
+        totals = np.zeros(len(FIELDS), dtype=np.int64)
+        self.doc_count = 0
+        for entry in manifest["segments"]:
+            index = BM25Index(os.path.join(path, entry["name"]))
+            deleted = np.empty(0, dtype=np.int64)
+            if entry.get("deleted"):
+                deleted = np.load(os.path.join(path, entry["name"], entry["deleted"]))
+            self.segments.append((index, deleted))
+
+            totals += index.field_totals - np.array([int(lengths[deleted].sum()) for lengths in index.doc_len])
+            self.doc_count += index.doc_count - len(deleted)
+
+        self.avg_len = totals / self.doc_count if self.doc_count else np.zeros(len(FIELDS))
+
+    def __len__(self):
+        return self.doc_count
+
+    def doc_freq(self, token):
+        """Live documents containing a token, over all segments."""
+        df = 0
+        for index, deleted in self.segments:
+            n = index.term_df(token)
+            if n and len(deleted):
+                n -= _count_in(deleted, index.term_docs(token))
+            df += n
+        return df
+
+    def top_k(self, query_tokens, k, weights=None, b=None, k1=None):
+        """(segment, doc, score) of the k best live documents; ties go to the older segment, then the lower doc."""
+        if not self.segments or not self.doc_count:
+            return []
+        stats = CollectionStats(self.doc_count, self.avg_len, self.doc_freq)
+        hits = []
+        for s, (index, deleted) in enumerate(self.segments):
+            docs, scores = index.top_k(query_tokens, k, weights, b, k1, stats, deleted)
+            hits.extend(zip((-scores).tolist(), [s] * len(docs), docs.tolist()))
+        hits.sort()
+        return [(s, doc, -score) for score, s, doc in hits[:k]]
+
+    def search(self, query_tokens, k, weights=None, b=None, k1=None):
+        """Node ids of the top k documents, weights / b per field and k1 as in bm25_index.field_params."""
+        return [self.segments[s][0].node_id(doc) for s, doc, _ in self.top_k(query_tokens, k, weights, b, k1)]
+
+
+class BM25SegmentStore:
+    """Write side: full rebuild, incremental update and merge of the segments at `path`."""
+    def __init__(self, path, memory_mb=BM25_BUILD_MEMORY_MB, on_commit=None):
+        self.path = path
+        self.memory_mb = memory_mb
+        self.on_commit = on_commit
+
+    def manifest(self):
+        return read_manifest(self.path)
+
+    def _segment_path(self, entry, *names):
+        return os.path.join(self.path, entry["name"], *names)
+
+    def _deleted(self, entry):
+        if not entry.get("deleted"):
+            return np.empty(0, dtype=np.int64)
+        return np.load(self._segment_path(entry, entry["deleted"]))
+
+    def _files(self, entry):
+        with open(self._segment_path(entry, "files.json"), "r") as f:
+            return json.load(f)
+
+    def _new_segment(self, docs):
+        """Indexes (node id, file, fields) documents as a new segment directory, returns its manifest entry."""
+        name = f"seg_{uuid.uuid4().hex[:12]}"
+        seg_path = os.path.join(self.path, name)
+        files = {}
+        with BM25IndexWriter(seg_path, self.memory_mb) as writer:
+            for node_id, file, fields in docs:
+                files.setdefault(file, []).append(writer.doc_count)
+                writer.add(node_id, fields)
+        with open(os.path.join(seg_path, "files.json"), "w") as f:
+            json.dump(files, f)
+        return {"name": name, "doc_count": writer.doc_count, "deleted": None, "deleted_count": 0}
+
+    def _tombstone(self, entry, doc_numbers, generation, retired):
+        """Entry with doc_numbers added to its tombstones (a new deleted file, the old one retired)."""
+        old = self._deleted(entry)
+        deleted = np.union1d(old, np.asarray(doc_numbers, dtype=np.int64))
+        if len(deleted) == len(old):
+            return entry
+        name = f"deleted.{generation}.npy"
+        np.save(self._segment_path(entry, name), deleted)
+        if entry.get("deleted"):
+            retired.append(os.path.join(entry["name"], entry["deleted"]))
+        return {**entry, "deleted": name, "deleted_count": int(len(deleted))}
+
+    def _commit(self, manifest, segments, retired, **changes):
+        """Writes the next manifest (call under the lock) and removes what the previous commit retired."""
+        live, dropped = [], []
+        for entry in segments:
+            (live if entry["doc_count"] > entry["deleted_count"] else dropped).append(entry["name"])
+        new = {
+            **manifest,
+            **changes,
+            "format": FORMAT_VERSION,
+            "generation": manifest.get("generation", 0) + 1,
+            "segments": [entry for entry in segments if entry["name"] in live],
+            "retired": retired + dropped
+        }
+        tmp_path = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(new, f)
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST))
+
+        #one commit old: readers that were opening it have it open by now
+        for rel_path in manifest.get("retired", []):
+            full_path = os.path.join(self.path, rel_path)
+            if os.path.isdir(full_path):
+                shutil.rmtree(full_path, ignore_errors=True)
+            elif os.path.exists(full_path):
+                try:
+                    os.remove(full_path)
+                except OSError:
+                    pass
+        if self.on_commit:
+            self.on_commit()
+        return new
+
+    def replace(self, docs, build, file_hashes):
+        """Full rebuild: docs become the only segment."""
+        os.makedirs(self.path, exist_ok=True)
+        entry = self._new_segment(docs)
+        with ManifestLock(self.path):
+            manifest = self.manifest() or {}
+            retired = [e["name"] for e in manifest.get("segments", [])]
+            #an index from before segments lived right in this directory
+            for name in os.listdir(self.path):
+                if name.endswith(".npy") or name == "meta.json":
+                    os.remove(os.path.join(self.path, name))
+            self._commit(manifest, [entry], retired, build=build, file_hashes=file_hashes)
+        return entry["doc_count"]
+
+    def update(self, docs, changed_files, file_hashes):
+        """
+        Indexes docs (the nodes of changed files) as a new segment and tombstones every
+        live doc of changed_files (changed or removed) in the older segments.
+        """
+        entry = self._new_segment(docs)
+        with ManifestLock(self.path):
+            manifest = self.manifest()
+            if manifest is None:
+                shutil.rmtree(self._segment_path(entry), ignore_errors=True)
+                raise FileNotFoundError(f"BM25 segments at {self.path} disappeared during the update")
+
+            generation = manifest["generation"] + 1
+            segments, retired = [], []
+            for old in manifest["segments"]:
+                files = self._files(old)
+                hits = [docs for file in changed_files for docs in [files.get(file)] if docs]
+                if hits:
+                    old = self._tombstone(old, np.concatenate(hits), generation, retired)
+                segments.append(old)
+            segments.append(entry)
+            self._commit(manifest, segments, retired, file_hashes=file_hashes)
+        return entry["doc_count"]
+
+    def merge_candidates(self, manifest, max_segments=BM25_MAX_SEGMENTS, max_deleted_ratio=BM25_MERGE_DELETED_RATIO):
+        """Segments to rewrite as one, in manifest order (empty: nothing worth merging)."""
+        segments = manifest["segments"]
+        picked = {e["name"] for e in segments if e["deleted_count"] > max_deleted_ratio * e["doc_count"]}
+        if len(segments) > max_segments:
+            for e in sorted(segments, key=lambda e: e["doc_count"] - e["deleted_count"]):
+                if len(segments) - len(picked) + 1 <= max_segments:
+                    break
+                picked.add(e["name"])
+        return [e for e in segments if e["name"] in picked]
+
+    def merge(self, max_segments=BM25_MAX_SEGMENTS, max_deleted_ratio=BM25_MERGE_DELETED_RATIO):
+        """
+        Rewrites the merge candidates as one segment without their tombstoned docs. False
+        if there was nothing to do, or the segments changed underneath (a rebuild).
+        """
+        manifest = self.manifest()
+        if manifest is None:
+            return False
+        picked = self.merge_candidates(manifest, max_segments, max_deleted_ratio)
+        if not picked:
+            return False
+
+        name = f"seg_{uuid.uuid4().hex[:12]}"
+        seg_path = os.path.join(self.path, name)
+        files, remaps, snapshot = {}, {}, {}
+        with BM25IndexWriter(seg_path, self.memory_mb) as writer:
+            for entry in picked:
+                snapshot[entry["name"]] = deleted = self._deleted(entry)
+                remaps[entry["name"]] = remap = writer.add_index(BM25Index(self._segment_path(entry)), deleted)
+                for file, docs in self._files(entry).items():
+                    moved = remap[np.asarray(docs, dtype=np.int64)]
+                    moved = moved[moved >= 0]
+                    if len(moved):
+                        files.setdefault(file, []).extend(moved.tolist())
+        with open(os.path.join(seg_path, "files.json"), "w") as f:
+            json.dump(files, f)
+        merged = {"name": name, "doc_count": writer.doc_count, "deleted": None, "deleted_count": 0}
+
+        with ManifestLock(self.path):
+            current = self.manifest()
+            names = {e["name"] for e in picked}
+            live = {e["name"]: e for e in current["segments"]} if current else {}
+            if current is None or current.get("build") != manifest.get("build") or not names <= set(live):
+                shutil.rmtree(seg_path, ignore_errors=True)
+                return False
+
+            #tombstones added while this merge ran move to the merged segment
+            late = []
+            for entry_name in names:
+                extra = np.setdiff1d(self._deleted(live[entry_name]), snapshot[entry_name])
+                late.append(remaps[entry_name][extra])
+            late = np.concatenate(late)
+            retired = list(names)
+            if len(late[late >= 0]):
+                merged = self._tombstone(merged, late[late >= 0], current["generation"] + 1, retired)
+
+            segments = []
+            for entry in current["segments"]:
+                if entry["name"] not in names:
+                    segments.append(entry)
+                elif merged is not None:
+                    #the merged segment takes the place of the oldest one it replaces
+                    segments.append(merged)
+                    merged = None
+            self._commit(current, segments, retired)
+
+        print(f"[BM25] => Merged {len(picked)} segments into {name} ({writer.doc_count} docs)")
+        return True
+
+
+class BackgroundMerger:
+    """Merges segments on a daemon thread after builds; one merge at a time, requests coalesce."""
+    def __init__(self, path, on_commit=None):
+        self.path = path
+        self.on_commit = on_commit
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
+
+    def schedule(self):
+        with self._lock:
+            if self._thread is not None:
+                self._pending = True
+                return
+            self._thread = threading.Thread(target=self._run, name="bm25-merge", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                store = BM25SegmentStore(self.path, on_commit=self.on_commit)
+                while store.merge():
+                    pass
+            except Exception as e:
+                print(f"[BM25] => Background merge failed: {e}")
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                self._pending = False
+
+    def wait(self, timeout=None):
+        """Blocks until the current merge (if any) is done."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
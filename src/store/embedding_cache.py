@@ -0,0 +1,246 @@
+import os
+import re
+import pickle
+import hashlib
+import threading
+import numpy as np
+from src.config import EMBED_CACHE_DIR, EMBED_CACHE_MAX_ENTRIES
+
+INITIAL_CAPACITY = 1024
+FREE = np.iinfo(np.int64).max  # last_used of a row without a key, never picked for eviction
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache shared by every repo that is ingested.
+
+    Vectors live in one memory-mapped float32 matrix (vectors.f32); index.pkl maps
+    sha1(namespace + normalized chunk text) to a row. The namespace is the model name,
+    plus the inference mode the model actually runs in when it is not plain float32
+    torch (int8 and ONNX vectors differ slightly, they are never mixed with the float32 ones). When max_entries is
+    reached the least recently used keys are evicted. Unchanged functions, in a re-ingest
+    or in a fork of the same repo, never reach the model again.
+
+    index.pkl is only rewritten by save(), so a row it still maps must keep its vector
+    until then: evicted rows are reused after the next save(), new vectors meanwhile go
+    to free rows or past max_entries, and save() compacts the file back to max_entries.
+    """
+    def __init__(self, model_name, cache_dir=EMBED_CACHE_DIR, max_entries=EMBED_CACHE_MAX_ENTRIES, inference="torch"):
+        self.model_name = model_name
+        self.namespace = model_name if inference == "torch" else f"{model_name}@{inference}"
+        self.max_entries = max_entries
+        self.dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", self.namespace))
+        self.matrix_path = os.path.join(self.dir, "vectors.f32")
+        self.index_path = os.path.join(self.dir, "index.pkl")
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.dim = None
+        self.capacity = 0
+        self.keys = {}          # key -> row
+        self.row_keys = []      # row -> key
+        self.free_rows = []     # rows without a key that the saved index does not map either
+        self.retired = []       # rows evicted since the last save(), still mapped by index.pkl
+        self.last_used = np.zeros(0, dtype=np.int64)
+        self.tick = 0
+        self.matrix = None
+        self.load()
+
+    @staticmethod
+    def normalize(text):
+        """Whitespace-only edits (line endings, trailing spaces) keep the same key."""
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+    def key(self, text):
+        return hashlib.sha1(f"{self.namespace}\0{self.normalize(text)}".encode("utf-8", errors="ignore")).hexdigest()
+
+    def load(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.matrix_path):
+            return
+        try:
+            with open(self.index_path, "rb") as f:
+                index = pickle.load(f)
+            expected = index["capacity"] * index["dim"] * 4
+            #a save() stopped before its final truncate leaves a longer file, the rows are still right
+            if index["model_name"] != self.namespace or os.path.getsize(self.matrix_path) < expected:
+                raise ValueError("index does not match the vector file")
+
+            self.dim = index["dim"]
+            self.capacity = index["capacity"]
+            self.keys = index["keys"]
+            self.row_keys = index["row_keys"]
+            self.last_used = index["last_used"]
+            self.tick = index["tick"]
+            self.free_rows = [row for row, key in enumerate(self.row_keys) if key is None]
+            self.last_used[self.free_rows] = FREE
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        except Exception as e:
+            print(f"[EmbedCache] => Starting a new cache ({e})")
+            self.dim, self.capacity, self.keys, self.row_keys = None, 0, {}, []
+            self.free_rows, self.retired = [], []
+            self.last_used = np.zeros(0, dtype=np.int64)
+            self.matrix = None
+
+    def _resize(self, capacity):
+        """Remaps the vector file with `capacity` rows."""
+        os.makedirs(self.dir, exist_ok=True)
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        if capacity > len(self.last_used):
+            self.last_used = np.concatenate([self.last_used, np.full(capacity - len(self.last_used), FREE, dtype=np.int64)])
+        else:
+            self.last_used = self.last_used[:capacity]
+        self.capacity = capacity
+
+    def _grow(self, needed):
+        """Makes room for `needed` rows: doubling up to max_entries, in steps past it until save()."""
+        capacity = max(self.capacity, min(INITIAL_CAPACITY, self.max_entries))
+        while capacity < needed and capacity < self.max_entries:
+            capacity = min(capacity * 2, self.max_entries)
+        if capacity < needed:
+            capacity = max(needed, capacity + INITIAL_CAPACITY)
+        if capacity != self.capacity:
+            self._resize(capacity)
+
+    def _free_rows(self, count):
+        """
+        Rows to write `count` new vectors into. The least recently used keys are evicted
+        so at most max_entries stay cached, but their rows are only reused after save().
+        """
+        evict = len(self.keys) + count - self.max_entries
+        if evict > 0:
+            #rows without a key are FREE, rows hit in this call carry the current tick: both go last
+            victims = np.argpartition(self.last_used[:len(self.row_keys)], evict - 1)[:evict].tolist()
+            for row in victims:
+                del self.keys[self.row_keys[row]]
+                self.row_keys[row] = None
+                self.last_used[row] = FREE
+            self.retired.extend(victims)
+            self.evictions += evict
+
+        reused = self.free_rows[max(0, len(self.free_rows) - count):]
+        del self.free_rows[len(self.free_rows) - len(reused):]
+
+        used = len(self.row_keys)
+        fresh = count - len(reused)
+        self._grow(used + fresh)
+        self.row_keys.extend([None] * fresh)
+        return reused + list(range(used, used + fresh))
+
+    def _compact(self):
+        """Moves the rows past max_entries into free rows below it and shrinks the file."""
+        used = len(self.row_keys)
+        overflow = [row for row in range(self.max_entries, used) if self.row_keys[row] is not None]
+        targets = sorted(row for row in self.free_rows if row < self.max_entries)[:len(overflow)]
+        for old, row in zip(overflow, targets):
+            self.matrix[row] = self.matrix[old]
+            key = self.row_keys[old]
+            self.keys[key] = row
+            self.row_keys[row] = key
+            self.last_used[row] = self.last_used[old]
+        self.matrix.flush()
+
+        self.row_keys = self.row_keys[:self.max_entries]
+        self.free_rows = [row for row, key in enumerate(self.row_keys) if key is None]
+        self.capacity = self.max_entries
+        self.last_used = self.last_used[:self.capacity]
+        #the moved rows are mapped by the new index before the old ones are cut off
+        self._write_index()
+        self._resize(self.capacity)
+
+    def embed_documents(self, texts, embed_fn):
+        """Returns (len(texts), dim) float32 vectors; only cache misses go through embed_fn."""
+        keys = [self.key(t) for t in texts]
+
+        with self.lock:
+            self.tick += 1
+            rows = [self.keys.get(k) for k in keys]
+            missing = [i for i, row in enumerate(rows) if row is None]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+            hit_rows = [row for row in rows if row is not None]
+            if hit_rows:
+                self.last_used[hit_rows] = self.tick
+                #copied now, another thread may reuse the rows once the lock is released
+                hit_vectors = np.array(self.matrix[hit_rows])
+
+        new_vectors = None
+        if missing:
+            #one embed call per distinct missing text
+            unique = {}
+            for i in missing:
+                unique.setdefault(keys[i], i)
+            new_vectors = np.asarray(embed_fn([texts[i] for i in unique.values()]), dtype=np.float32)
+
+        with self.lock:
+            if self.dim is None:
+                if new_vectors is None:
+                    return np.empty((len(texts), 0), dtype=np.float32)
+                self.dim = new_vectors.shape[1]
+
+            out = np.empty((len(texts), self.dim), dtype=np.float32)
+            if hit_rows:
+                out[[i for i, row in enumerate(rows) if row is not None]] = hit_vectors
+
+            if new_vectors is not None:
+                by_key = dict(zip(unique.keys(), new_vectors))
+                for i in missing:
+                    out[i] = by_key[keys[i]]
+
+                #another thread may have stored the same miss meanwhile
+                store = [(k, vector) for k, vector in by_key.items() if k not in self.keys]
+                store = store[-self.max_entries:] if self.max_entries else []
+                if store:
+                    free = self._free_rows(len(store))
+                    for row, (k, vector) in zip(free, store):
+                        self.matrix[row] = vector
+                        self.keys[k] = row
+                        self.row_keys[row] = k
+                        self.last_used[row] = self.tick
+            return out
+
+    def _write_index(self):
+        index = {
+            "model_name": self.namespace,
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "keys": self.keys,
+            "row_keys": self.row_keys,
+            "last_used": self.last_used,
+            "tick": self.tick
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def save(self):
+        with self.lock:
+            if self.matrix is None:
+                return
+            self.matrix.flush()
+            self._write_index()
+            #the saved index no longer maps the evicted rows
+            self.free_rows.extend(self.retired)
+            self.retired = []
+            if self.capacity > self.max_entries:
+                self._compact()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.keys),
+            "evictions": self.evictions
+        }
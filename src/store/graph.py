@@ -1,10 +1,11 @@
 import builtins
-import pickle
 import networkx as nx
 import json
 import os
 import inspect
 from src.config import *
+from src.ingestion.graph_format import SemanticGraphReader
+from src.store.graph_store import publish_graph_store
 
 class GraphBuilder:
     def __init__(self):
@@ -38,18 +39,28 @@ class GraphBuilder:
         if not os.path.exists(INPUT_FILE):
             raise FileNotFoundError(f'Missing ingestion data')
         
-        #loading all nodes
-        with open(INPUT_FILE, 'r') as f:
-            data = json.load(f)
-        
-        nodes = data.get('nodes', [])
-        edges = data.get('edges', [])
+        #streaming nodes and edges out of the ingestion file
+        with SemanticGraphReader(INPUT_FILE) as data:
+            outgoing_edge_map = self.add_all(data)
+            
+        print(f'[Graph] => Saving Graph to {GRAPH_OUTPUT_FILE}')
+        #a new generation file, the one the registry has mapped is left alone
+        publish_graph_store(self.graph, GRAPH_OUTPUT_FILE)
         
-        print(f'[Graph] => Processing {len(nodes)} nodes with {len(edges)} edges')
+        print(f"[Graph] => Saving Dependency Map to {DEPENDENCY_MAP_FILE}")
+        with open(DEPENDENCY_MAP_FILE, 'w') as f:
+            json.dump(outgoing_edge_map, f, indent=2)
+            
+
+        print('[Graph] => Everything Completed !!')
+
+    def add_all(self, data):
+        """Adds every node and edge of the ingestion file, returns the dependency map."""
+        print(f'[Graph] => Processing {data.node_count} nodes with {data.edge_count} edges')
         
         
         #Creating nodes...
-        for node in nodes:
+        for node in data.iter_nodes():
             clean_id = self.correct_id(node['id'])
             self.graph.add_node(
                 clean_id,
@@ -60,7 +71,7 @@ class GraphBuilder:
         outgoing_edge_map = {} 
         
         
-        for edge in edges:
+        for edge in data.iter_edges():
             src = edge['source']
             tar = edge['target']
             
@@ -100,14 +111,5 @@ class GraphBuilder:
                     outgoing_edge_map[src] = []
                 if tar not in outgoing_edge_map[src]:
                     outgoing_edge_map[src].append(tar)
-            
-        print(f'[Graph] => Saving Graph to {GRAPH_OUTPUT_FILE}')
-        with open(GRAPH_OUTPUT_FILE, 'wb') as f:
-            pickle.dump(self.graph, f)
         
-        print(f"[Graph] => Saving Dependency Map to {DEPENDENCY_MAP_FILE}")
-        with open(DEPENDENCY_MAP_FILE, 'w') as f:
-            json.dump(outgoing_edge_map, f, indent=2)
-            
-
-        print('[Graph] => Everything Completed !!')
+        return outgoing_edge_map
@@ -0,0 +1,53 @@
+import os
+import threading
+from src.config import GRAPH_OUTPUT_FILE
+from src.store.graph_store import GraphStore, resolve_graph_store
+
+
+class GraphRegistry:
+    """
+    Process-wide handle on the structure graph. The store is opened once and again
+    only when the file changes on disk (mtime/size), so FileReader_, expander and the
+    grader all share one copy. The graph is read-only. `path` is the pointer file a
+    build swaps; the generation file it names is never replaced while mapped.
+    """
+    def __init__(self, path=GRAPH_OUTPUT_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.graph = None
+        self.version = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self):
+        """The current graph, or None if it was never built."""
+        version = self._stat()
+        if version is not None and version == self.version:
+            return self.graph
+
+        with self.lock:
+            if version == self.version:
+                return self.graph
+            if version is None:
+                self.graph, self.version = None, None
+                return None
+            try:
+                graph = GraphStore(resolve_graph_store(self.path))
+            except Exception as e:
+                #mid-rewrite or unreadable: keep serving the last good graph
+                print(f"[GraphRegistry] => Could not load {self.path}: {e}")
+                return self.graph
+            self.graph, self.version = graph, version
+            return graph
+
+    def clear(self):
+        with self.lock:
+            self.graph, self.version = None, None
+
+
+shared_graph_registry = GraphRegistry()
@@ -0,0 +1,324 @@
+import os
+import re
+import json
+import mmap
+import struct
+import networkx as nx
+import numpy as np
+from src.ingestion.graph_format import NODE_STR_COLUMNS, NODE_INT_COLUMNS, NO_STRING, NO_INT
+
+# Compact replacement for the pickled networkx DiGraph.
+#
+# [header][arrays ...][meta json]
+#
+# Nodes are numbered 0..n-1 in insertion order. Adjacency is stored twice, as CSR
+# (successors) and CSC (predecessors): indptr[i]:indptr[i+1] is the slice of
+# neighbour numbers for node i. Node attributes are columns of string table
+# indexes / ints, plus a json "extras" blob per node for everything else. The file
+# is memory-mapped and every array is a zero-copy view, so opening it costs the
+# same for ten nodes or a million.
+#
+# A mapped file can not be replaced on Windows, so every build writes a new
+# generation (structure_graph.<n>.csr) and then swaps the small pointer file at the
+# configured path, which names it. Older generations are deleted once nothing maps them.
+
+MAGIC = b"CSG1"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQ")  # magic, version, meta offset, meta length
+
+STR_COLUMNS = NODE_STR_COLUMNS + ["file_id"]
+INT_COLUMNS = NODE_INT_COLUMNS
+
+
+def write_graph_store(graph, path):
+    """Writes a networkx DiGraph (as built by GraphBuilder) in the CSR format."""
+    keys = list(graph.nodes)
+    number = {key: i for i, key in enumerate(keys)}
+
+    strings = {}
+    def intern(value):
+        if not isinstance(value, str):
+            return NO_STRING
+        return strings.setdefault(value, len(strings))
+
+    arrays = {"key": np.array([intern(k) for k in keys], dtype="<u4")}
+
+    columns = {col: [] for col in STR_COLUMNS + INT_COLUMNS}
+    extra_offsets = [0]
+    extra_blob = bytearray()
+    for key in keys:
+        attrs = graph.nodes[key]
+        for col in STR_COLUMNS:
+            columns[col].append(intern(attrs.get(col)))
+        for col in INT_COLUMNS:
+            value = attrs.get(col)
+            columns[col].append(value if isinstance(value, int) and not isinstance(value, bool) else NO_INT)
+
+        extras = {}
+        for name, value in attrs.items():
+            if name in STR_COLUMNS and isinstance(value, str):
+                continue
+            if name in INT_COLUMNS and isinstance(value, int) and not isinstance(value, bool):
+                continue
+            extras[name] = value
+        if extras:
+            extra_blob += json.dumps(extras).encode("utf-8")
+        extra_offsets.append(len(extra_blob))
+
+    for col in STR_COLUMNS:
+        arrays[f"col.{col}"] = np.array(columns[col], dtype="<u4")
+    for col in INT_COLUMNS:
+        arrays[f"col.{col}"] = np.array(columns[col], dtype="<i4")
+    arrays["extras.offsets"] = np.array(extra_offsets, dtype="<i8")
+    arrays["extras.blob"] = np.frombuffer(bytes(extra_blob), dtype="u1")
+
+    #CSR (successors, with the edge relation) and CSC (predecessors), neighbours in insertion order
+    out_ptr, out_idx, out_rel = [0], [], []
+    in_ptr, in_idx = [0], []
+    for key in keys:
+        for target, attrs in graph.succ[key].items():
+            out_idx.append(number[target])
+            out_rel.append(intern(attrs.get("relation")))
+        out_ptr.append(len(out_idx))
+        for source in graph.pred[key]:
+            in_idx.append(number[source])
+        in_ptr.append(len(in_idx))
+
+    arrays["out.indptr"] = np.array(out_ptr, dtype="<i8")
+    arrays["out.indices"] = np.array(out_idx, dtype="<i4")
+    arrays["out.relation"] = np.array(out_rel, dtype="<u4")
+    arrays["in.indptr"] = np.array(in_ptr, dtype="<i8")
+    arrays["in.indices"] = np.array(in_idx, dtype="<i4")
+
+    #node numbers sorted by id, for binary search lookups
+    arrays["key_order"] = np.array(sorted(range(len(keys)), key=lambda i: keys[i]), dtype="<i4")
+
+    offsets = [0]
+    blob = bytearray()
+    for s in strings:
+        blob += s.encode("utf-8", errors="surrogatepass")
+        offsets.append(len(blob))
+    arrays["strings.offsets"] = np.array(offsets, dtype="<i8")
+    arrays["strings.blob"] = np.frombuffer(bytes(blob), dtype="u1")
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        layout = {}
+        for name, arr in arrays.items():
+            f.write(b"\0" * (-f.tell() % 8))
+            layout[name] = [f.tell(), arr.dtype.str, len(arr)]
+            f.write(arr.tobytes())
+
+        meta = json.dumps({
+            "node_count": len(keys),
+            "edge_count": len(out_idx),
+            "arrays": layout
+        }).encode("utf-8")
+        meta_off = f.tell()
+        f.write(meta)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, meta_off, len(meta)))
+
+
+def _generations(path):
+    """(generation, file name) of every generation file next to the pointer at path."""
+    directory, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    pattern = re.compile(rf"{re.escape(stem)}\.(\d+){re.escape(ext)}$")
+    found = []
+    for entry in os.listdir(directory or "."):
+        m = pattern.match(entry)
+        if m:
+            found.append((int(m.group(1)), entry))
+    return sorted(found)
+
+
+def publish_graph_store(graph, path):
+    """Writes the graph as a new generation file, then points `path` at it."""
+    directory, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    generations = _generations(path)
+    file_name = f"{stem}.{generations[-1][0] + 1 if generations else 1}{ext}"
+    write_graph_store(graph, os.path.join(directory, file_name))
+
+    #readers never see a half written graph, and the file they have mapped stays in place
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(file_name)
+    os.replace(tmp_path, path)
+
+    for _, old in generations:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass  # still mapped (Windows), the next build tries again
+
+
+def resolve_graph_store(path):
+    """The graph file the pointer at path names (path itself for a store written before generations)."""
+    with open(path, "rb") as f:
+        head = f.read(256)
+    if head.startswith(MAGIC):
+        return path
+    return os.path.join(os.path.dirname(path), head.decode("utf-8").strip())
+
+
+class NodeView:
+    """graph.nodes: `id in nodes`, nodes[id] -> attribute dict, iteration in insertion order."""
+    def __init__(self, store):
+        self._store = store
+
+    def __contains__(self, key):
+        return self._store.number(key) >= 0
+
+    def __getitem__(self, key):
+        i = self._store.number(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._store.attributes(i)
+
+    def __iter__(self):
+        return (self._store.key(i) for i in range(self._store.node_count))
+
+    def __len__(self):
+        return self._store.node_count
+
+
+class GraphStore:
+    """
+    Read-only view of a file written by write_graph_store. Answers the networkx calls
+    the query side uses (nodes, successors, predecessors, `in`) straight from the
+    memory-mapped arrays.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, meta_off, meta_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a graph store file (v{VERSION})")
+
+        meta = json.loads(self._mm[meta_off:meta_off + meta_len].decode("utf-8"))
+        self.node_count = meta["node_count"]
+        self.edge_count = meta["edge_count"]
+        self._arrays = {
+            name: np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset) if count else np.empty(0, dtype=dtype)
+            for name, (offset, dtype, count) in meta["arrays"].items()
+        }
+        self._strings = {}
+        self._numbers = {}
+        self.nodes = NodeView(self)
+
+    def string(self, idx):
+        if idx == NO_STRING:
+            return None
+        value = self._strings.get(idx)
+        if value is None:
+            offsets = self._arrays["strings.offsets"]
+            raw = self._arrays["strings.blob"][offsets[idx]:offsets[idx + 1]]
+            value = raw.tobytes().decode("utf-8", errors="surrogatepass")
+            self._strings[idx] = value
+        return value
+
+    def key(self, i):
+        return self.string(int(self._arrays["key"][i]))
+
+    def number(self, key):
+        """Node number of an id, -1 if absent (binary search over the sorted ids)."""
+        if not isinstance(key, str):
+            return -1
+        i = self._numbers.get(key)
+        if i is not None:
+            return i
+
+        order = self._arrays["key_order"]
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        i = int(order[lo]) if lo < len(order) and self.key(order[lo]) == key else -1
+        #misses are cached too, bounded so arbitrary lookups cannot grow it forever
+        if len(self._numbers) < 100000:
+            self._numbers[key] = i
+        return i
+
+    def attributes(self, i):
+        """Attribute dict of node number i (a fresh dict, changes are not stored)."""
+        attrs = {}
+        for col in STR_COLUMNS:
+            value = self._arrays[f"col.{col}"][i]
+            if value != NO_STRING:
+                attrs[col] = self.string(int(value))
+        for col in INT_COLUMNS:
+            value = self._arrays[f"col.{col}"][i]
+            if value != NO_INT:
+                attrs[col] = int(value)
+
+        offsets = self._arrays["extras.offsets"]
+        if offsets[i + 1] > offsets[i]:
+            raw = self._arrays["extras.blob"][offsets[i]:offsets[i + 1]]
+            attrs.update(json.loads(raw.tobytes().decode("utf-8")))
+        return attrs
+
+    def _neighbours(self, key, direction):
+        i = self.number(key)
+        if i < 0:
+            raise nx.NetworkXError(f"The node {key} is not in the digraph.")
+        indptr = self._arrays[f"{direction}.indptr"]
+        indices = self._arrays[f"{direction}.indices"][indptr[i]:indptr[i + 1]]
+        return (self.key(j) for j in indices)
+
+    def successors(self, key):
+        return self._neighbours(key, "out")
+
+    def predecessors(self, key):
+        return self._neighbours(key, "in")
+
+    def get_edge_data(self, source, target, default=None):
+        """{"relation": ...} of the edge, the only edge attribute the store keeps."""
+        i, j = self.number(source), self.number(target)
+        if i < 0 or j < 0:
+            return default
+        indptr = self._arrays["out.indptr"]
+        targets = self._arrays["out.indices"][indptr[i]:indptr[i + 1]]
+        hits = np.flatnonzero(targets == j)
+        if not len(hits):
+            return default
+        relation = self._arrays["out.relation"][indptr[i] + hits[0]]
+        return {"relation": self.string(int(relation))}
+
+    def has_node(self, key):
+        return key in self.nodes
+
+    def number_of_nodes(self):
+        return self.node_count
+
+    def number_of_edges(self):
+        return self.edge_count
+
+    def __contains__(self, key):
+        return key in self.nodes
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return self.node_count
+
+    def close(self):
+        self._arrays = {}
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # arrays still referenced elsewhere, the mapping goes away with them
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,112 @@
+import os
+import re
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+from src.config import SOURCE_CACHE_MAX_FILES
+
+# Same line breaks as text-mode readlines() (universal newlines)
+LINE_BREAK = re.compile(rb"\r\n|\r|\n")
+
+
+class SourceFile:
+    """One memory-mapped source file plus the byte offset of every line start."""
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.version = (stat.st_mtime_ns, stat.st_size)
+        with open(path, "rb") as f:
+            #the mapping stays valid once the file is closed, no descriptor is held per cached file
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+
+        self.line_starts = array("Q", [0])
+        for m in LINE_BREAK.finditer(self.data):
+            self.line_starts.append(m.end())
+
+        size = len(self.data)
+        self.line_count = len(self.line_starts) - 1 if self.line_starts[-1] == size else len(self.line_starts)
+
+    def _offset(self, line):
+        return self.line_starts[line] if line < len(self.line_starts) else len(self.data)
+
+    def slice(self, start, end):
+        """Raw bytes of lines[start:end] (python slice rules), without copying. Only valid until close()."""
+        lines = range(self.line_count)[start:end]
+        if not lines:
+            return memoryview(b"")
+        return memoryview(self.data)[self._offset(lines.start):self._offset(lines.stop)]
+
+    def close(self):
+        try:
+            if isinstance(self.data, mmap.mmap):
+                self.data.close()
+        except BufferError:
+            pass  # a slice is still in use, the mapping goes away with it
+
+
+def decode(raw):
+    """Decodes like open(..., encoding='utf-8', errors='ignore') in text mode."""
+    text = str(raw, "utf-8", errors="ignore")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+class SourceCache:
+    """
+    Bounded LRU of memory-mapped files, shared by the index builders and the query-time reader.
+    Each file is read and split into lines once; callers get (start, end) line slices,
+    copied out under the lock, so an eviction or clear() never closes a mapping mid-read.
+    A file that changed on disk (mtime/size) is mapped again.
+    """
+    def __init__(self, max_files=SOURCE_CACHE_MAX_FILES):
+        self.max_files = max_files
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get(self, path):
+        """The mapped file, mapped again if it changed. Call with the lock held."""
+        stat = os.stat(path)
+        source = self.files.get(path)
+        if source is not None and source.version == (stat.st_mtime_ns, stat.st_size):
+            self.files.move_to_end(path)
+            return source
+
+        if source is not None:
+            source.close()
+        source = SourceFile(path)
+        self.files[path] = source
+
+        while len(self.files) > self.max_files:
+            _, old = self.files.popitem(last=False)
+            old.close()
+        return source
+
+    def read_bytes(self, path, start, end=None):
+        path = os.path.abspath(path)
+        with self.lock:
+            return bytes(self._get(path).slice(start, end))
+
+    def read_text(self, path, start, end=None):
+        """Same as "".join(f.readlines()[start:end])."""
+        path = os.path.abspath(path)
+        with self.lock:
+            return decode(self._get(path).slice(start, end))
+
+    def read_lines(self, path, start, end=None):
+        """Same as f.readlines()[start:end]."""
+        path = os.path.abspath(path)
+        with self.lock:
+            source = self._get(path)
+            lines = range(source.line_count)[start:end]
+            return [decode(source.slice(i, i + 1)) for i in lines]
+
+    def clear(self):
+        """Drops every mapping (before the repo checkout is replaced)."""
+        with self.lock:
+            for source in self.files.values():
+                source.close()
+            self.files.clear()
+
+
+shared_source_cache = SourceCache()
@@ -0,0 +1,48 @@
+import re
+import string
+from src.config import TOKENIZER_KEEP_IDENTIFIERS
+
+# One tokenizer for the BM25 index and for queries, so `build_graph`, `buildGraph`,
+# `store.vector` and "build graph" all meet the same terms.
+#
+# The text is cut into words by one bytes.translate + split on the utf-8 encoding
+# (ASCII punctuation other than `_` becomes a space, both run in C). Each distinct
+# word is split once by PARTS (camelCase / PascalCase humps, acronyms: HTTPServer ->
+# HTTP, Server, digit runs, underscores dropped) and cached; code repeats the same
+# names a lot. Compound names are also kept whole, so an exact name still outranks
+# its parts.
+
+PUNCTUATION = string.punctuation.replace("_", "").encode()
+SEPARATORS = bytes.maketrans(PUNCTUATION, b" " * len(PUNCTUATION))
+PARTS = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[^\W\d_A-Z]+|[A-Z]+|[0-9]+")
+
+TOKENIZER_VERSION = "code-v1" + ("+ids" if TOKENIZER_KEEP_IDENTIFIERS else "")
+WORD_CACHE_SIZE = 200000
+
+_word_cache = {True: {}, False: {}}
+
+
+def split_word(word, keep_identifiers=TOKENIZER_KEEP_IDENTIFIERS):
+    """Tokens of one word: its lower-cased parts, plus the whole name if it has more than one part."""
+    parts = " ".join(PARTS.findall(word)).lower().split()
+    if keep_identifiers and len(parts) > 1:
+        name = word.strip("_")
+        if name and not name[0].isdigit():
+            parts.append(name.lower())
+    return parts
+
+
+def tokenize(text, keep_identifiers=TOKENIZER_KEEP_IDENTIFIERS):
+    """Code-aware tokens of text, used for both the BM25 documents and the queries."""
+    cache = _word_cache[bool(keep_identifiers)]
+    if len(cache) > WORD_CACHE_SIZE:
+        cache.clear()
+
+    tokens = []
+    add = tokens.extend
+    for word in text.encode("utf-8", errors="surrogatepass").translate(SEPARATORS).split():
+        parts = cache.get(word)
+        if parts is None:
+            parts = cache[word] = split_word(word.decode("utf-8", errors="surrogatepass"), keep_identifiers)
+        add(parts)
+    return tokens
@@ -1,23 +1,41 @@
 import json
 import os
+import hashlib
 import shutil
 import ast
 import gc
 import time
 import stat
-from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter, Language
 from langchain_core.documents import Document
 from src.config import *
+from src.ingestion.graph_format import SemanticGraphReader
+from src.store.source_cache import shared_source_cache
 from src.model import shared_embeddings
+from src.store.embedding_cache import EmbeddingCache
+from src.store.vector_backend import open_vector_backend
 
 MAX_CHUNK_SIZE = 3000 
 
+class CachedEmbeddings:
+    """The model behind an EmbeddingCache: only chunks it has never seen are sent to the model."""
+    def __init__(self, model, cache):
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        return self.cache.embed_documents(texts, self.model.embed_documents)
+
+    def embed_query(self, text):
+        return self.model.embed_query(text)
+
 class VectorStoreBuilder:
     def __init__(self):
         print(f"[Vector] => Loading Embedding Model: {MODEL_NAME}...")
         
-        self.embeddings = shared_embeddings
+        #keyed by the mode the model kept: a refused int8/ONNX mode embeds (and caches) float32
+        self.embedding_cache = EmbeddingCache(MODEL_NAME, inference=shared_embeddings.inference)
+        self.embeddings = CachedEmbeddings(shared_embeddings, self.embedding_cache)
         
         #python aware splitter for large files
         self.splitter = RecursiveCharacterTextSplitter.from_language(
@@ -34,11 +52,9 @@ class VectorStoreBuilder:
     def read_code(self, file_path, start_line, end_line):
         """Reads the exact lines from the source file."""
         try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()
-                start = max(0, start_line - 1)
-                end = end_line
-                return "".join(lines[start:end])
+            start = max(0, start_line - 1)
+            end = end_line
+            return shared_source_cache.read_text(file_path, start, end)
         except Exception as e:
             print(f"[Vector] => Could not read {file_path}: {e}")
             return ""
@@ -101,90 +117,194 @@ class VectorStoreBuilder:
             except Exception:
                 return
 
-    def build(self):
-        print('[Vector] => Started vector processing...')
-        
-        self.force_delete_folder(VECTOR_DB_DIR)
-        
-        if not os.path.exists(INPUT_FILE):
-             print(f"[Vector] => No graph file found at {INPUT_FILE}")
-             return
+    def open_store(self):
+        return open_vector_backend(VECTOR_DB_DIR, self.embeddings)
 
-        with open(INPUT_FILE, "r") as f:
-            data = json.load(f)
-        
-        documents = []
-        for node in data["nodes"]:
-            #accept functions, classes, and full modules
+    def load_index_keys(self):
+        """file -> index key of the last build, empty if there was none (or it predates stable ids)."""
+        if not os.path.exists(VECTOR_INDEX_KEYS_FILE):
+            return {}
+        try:
+            with open(VECTOR_INDEX_KEYS_FILE, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index_keys(self, file_keys):
+        #the store itself writes nothing until it holds a vector (e.g. a repo of empty modules)
+        os.makedirs(os.path.dirname(VECTOR_INDEX_KEYS_FILE), exist_ok=True)
+        tmp_path = VECTOR_INDEX_KEYS_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(file_keys, f)
+        os.replace(tmp_path, VECTOR_INDEX_KEYS_FILE)
+
+    @staticmethod
+    def doc_id(node_id, chunk_index):
+        """Stable id of one chunk, the same in every build while the node keeps its id."""
+        return f"{node_id}#{chunk_index}"
+
+    @staticmethod
+    def content_hash(doc, embedder):
+        """Everything that gets stored for a chunk: its text, its metadata and what embedded it."""
+        payload = json.dumps([doc.page_content, doc.metadata, embedder], sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8", errors="ignore")).hexdigest()
+
+    def index_keys(self, graph):
+        """
+        file -> key of everything its documents are built from: the file content, the
+        USES deps in the headers (a changed dependency map re-embeds the file too) and the
+        embedder (model and inference mode).
+        """
+        digests = {}
+        for node in graph.iter_nodes():
             if node["type"] not in ["function", "class", "module"]:
                 continue
+            file_hash = graph.files.get(node["file"])
+            if not file_hash:
+                continue
+            if node["file"] not in digests:
+                digests[node["file"]] = hashlib.sha1(f"{self.embedding_cache.namespace}\0{file_hash}".encode())
+            deps = self.dependency_map.get(node["id"])
+            if deps:
+                digests[node["file"]].update(json.dumps([node["id"], deps[:5]]).encode())
+        return {rel_path: d.hexdigest() for rel_path, d in digests.items()}
 
-            #construct full path using config REPO_PATH (Safe Data Dir)
-            full_path = os.path.join(REPO_PATH, node["file"])
-            
-            code_content = self.read_code(
-                full_path, 
-                node["start"], 
-                node["end"]
-            )
-            
-            if not code_content.strip(): continue
+    def make_documents(self, node):
+        """Turns one graph node into its (possibly chunked) documents."""
+        
+        #construct full path using config REPO_PATH (Safe Data Dir)
+        full_path = os.path.join(REPO_PATH, node["file"])
+        
+        code_content = self.read_code(
+            full_path, 
+            node["start"], 
+            node["end"]
+        )
+        
+        if not code_content.strip(): return []
 
-            #handle modules , functions
-            if node["type"] == "module":
-                final_content = self.get_skeleton_code(code_content)
-                header = f"FILE_CONTEXT: {node['file']}\n(Contains Imports, Globals, and Script Logic)\n"
-            else:
-                final_content = code_content
-                header = self.get_header(node)
-
-            base_metadata = {
-                "id": node["id"],
-                "file": node["file"],
-                "start_line": node["start"],
-                "end_line": node["end"],
-                "role": "container" if node["type"] == "module" else "logic",
-                "node_type": node["type"],
-              
-            }
-            
-            # Chunking logic
-            if len(final_content) > MAX_CHUNK_SIZE:
-                chunks = self.splitter.split_text(final_content)
-                for i, chunk in enumerate(chunks):
-                    doc = Document(
-                        page_content=f"{header}\n--- PART {i+1} ---\n{chunk}",
-                        metadata={
-                            **base_metadata,
-                            "is_chunk": True,
-                            "chunk_index": i,
-                            "total_chunks": len(chunks)
-                        }
-                    )
-                    documents.append(doc)
-            else:
+        #handle modules , functions
+        if node["type"] == "module":
+            final_content = self.get_skeleton_code(code_content)
+            header = f"FILE_CONTEXT: {node['file']}\n(Contains Imports, Globals, and Script Logic)\n"
+        else:
+            final_content = code_content
+            header = self.get_header(node)
+
+        base_metadata = {
+            "id": node["id"],
+            "file": node["file"],
+            "start_line": node["start"],
+            "end_line": node["end"],
+            "role": "container" if node["type"] == "module" else "logic",
+            "node_type": node["type"],
+          
+        }
+        
+        documents = []
+        # Chunking logic
+        if len(final_content) > MAX_CHUNK_SIZE:
+            chunks = self.splitter.split_text(final_content)
+            for i, chunk in enumerate(chunks):
                 doc = Document(
-                    page_content=f"{header}\n--- FULL BODY ---\n{final_content}",
+                    page_content=f"{header}\n--- PART {i+1} ---\n{chunk}",
                     metadata={
                         **base_metadata,
-                        "is_chunk": False,
-                        "chunk_index": 0,
-                        "total_chunks": 1
+                        "is_chunk": True,
+                        "chunk_index": i,
+                        "total_chunks": len(chunks)
                     }
                 )
                 documents.append(doc)
-                
-        if documents:
-            print(f"[Vector] => Embedding {len(documents)} documents...")
-            vector_db = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                persist_directory=VECTOR_DB_DIR,
-                collection_name="codebase_v1"
-            )
-            #vector_db.persist() # New Chroma versions persist automatically
-            del vector_db 
-            gc.collect()
-            print(f"[Vector] => Saved to {VECTOR_DB_DIR}")
         else:
-            print("[Vector] => No documents to index!")
\ No newline at end of file
+            doc = Document(
+                page_content=f"{header}\n--- FULL BODY ---\n{final_content}",
+                metadata={
+                    **base_metadata,
+                    "is_chunk": False,
+                    "chunk_index": 0,
+                    "total_chunks": 1
+                }
+            )
+            documents.append(doc)
+        
+        for doc in documents:
+            doc.metadata["content_hash"] = self.content_hash(doc, self.embedding_cache.namespace)
+        return documents
+
+    def build(self):
+        print('[Vector] => Started vector processing...')
+        
+        if not os.path.exists(INPUT_FILE):
+             print(f"[Vector] => No graph file found at {INPUT_FILE}")
+             return
+
+        with SemanticGraphReader(INPUT_FILE) as graph:
+            self.index_nodes(graph)
+
+    def index_nodes(self, graph):
+        file_keys = self.index_keys(graph)
+        if not file_keys:
+            self.force_delete_folder(VECTOR_DB_DIR)
+            print("[Vector] => No documents to index!")
+            return
+        
+        #only files whose content (or headers) changed since the last build are read and diffed
+        old_keys = self.load_index_keys() if os.path.exists(VECTOR_DB_DIR) else {}
+        changed = {rel_path for rel_path, key in file_keys.items() if old_keys.get(rel_path) != key}
+        removed = {rel_path for rel_path in old_keys if rel_path not in file_keys}
+        vector_db = self.open_store()
+        if not changed and not removed:
+            if vector_db.needs_rewrite():
+                #e.g. VECTOR_QUANTIZATION changed: close() rewrites the stored vectors, nothing is embedded
+                print("[Vector] => Rewriting the vector store for the current settings...")
+                vector_db.close()
+            else:
+                print("[Vector] => Vector store already up to date")
+            return
+        
+        #without the keys of the last build every stored document is diffed
+        stored = vector_db.stored_hashes(changed | removed if old_keys else None)
+        
+        wanted = {}
+        seen = {}
+        for node in graph.iter_nodes():
+            #accept functions, classes, and full modules
+            if node["type"] not in ["function", "class", "module"] or node["file"] not in changed:
+                continue
+            
+            #a node id defined twice (e.g. a redefined function) numbers its later copies
+            copies = seen.get(node["id"], 0)
+            seen[node["id"]] = copies + 1
+            node_id = node["id"] if not copies else f"{node['id']}~{copies}"
+            
+            for doc in self.make_documents(node):
+                wanted[self.doc_id(node_id, doc.metadata["chunk_index"])] = doc
+        
+        if not wanted and not old_keys:
+            print("[Vector] => No documents to index!")
+        
+        #new or changed chunks are upserted, chunks that are gone are deleted; unchanged ones are left alone
+        upsert_ids = [doc_id for doc_id, doc in wanted.items() if stored.get(doc_id) != doc.metadata["content_hash"]]
+        delete_ids = [doc_id for doc_id in stored if doc_id not in wanted]
+        
+        if delete_ids:
+            print(f"[Vector] => Removing {len(delete_ids)} outdated documents...")
+            for i in range(0, len(delete_ids), VECTOR_WRITE_BATCH):
+                vector_db.delete(ids=delete_ids[i:i + VECTOR_WRITE_BATCH])
+        
+        if upsert_ids:
+            print(f"[Vector] => Embedding {len(upsert_ids)} documents ({len(wanted) - len(upsert_ids)} unchanged)...")
+            for i in range(0, len(upsert_ids), VECTOR_WRITE_BATCH):
+                batch = upsert_ids[i:i + VECTOR_WRITE_BATCH]
+                vector_db.upsert(batch, [wanted[doc_id] for doc_id in batch])
+            self.embedding_cache.save()
+            stats = self.embedding_cache.stats()
+            print(f"[Vector] => Embedding cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+        
+        vector_db.close()
+        del vector_db 
+        gc.collect()
+        #written last: a build that stops halfway is diffed again next time
+        self.save_index_keys(file_keys)
+        print(f"[Vector] => Saved to {VECTOR_DB_DIR}")
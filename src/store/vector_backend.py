@@ -0,0 +1,143 @@
+import numpy as np
+from langchain_core.documents import Document
+from src.config import VECTOR_BACKEND, VECTOR_WRITE_BATCH, VECTOR_IVF_MIN_ROWS, VECTOR_IVF_NPROBE, VECTOR_MMR_POOL, VECTOR_MMR_LAMBDA
+from src.config import VECTOR_QUANTIZATION, VECTOR_RESCORE_FACTOR
+from src.store.vector_index import VectorIndex, mmr
+
+COLLECTION_NAME = "codebase_v1"
+
+
+class VectorBackend:
+    """
+    What VectorStoreBuilder and the retriever need from a vector store. Documents are
+    keyed by the builder's stable chunk ids; metadata carries "file" and "content_hash".
+    """
+    def stored_hashes(self, files=None):
+        """document id -> content hash for the documents of `files` (every file when None)."""
+        raise NotImplementedError
+
+    def upsert(self, ids, documents):
+        """Embeds and writes the documents, replacing any stored under the same ids."""
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def search(self, query, k, pool=VECTOR_MMR_POOL, lambda_mult=VECTOR_MMR_LAMBDA):
+        """
+        k documents for the query text: the `pool` most similar, re-ranked by maximal
+        marginal relevance (lambda_mult 1 = similarity only, 0 = diversity only).
+        """
+        raise NotImplementedError
+
+    def needs_rewrite(self):
+        """The stored layout differs from the configured one; close() rewrites it."""
+        return False
+
+    def close(self):
+        """Makes the writes visible to readers that open the store afterwards."""
+
+
+class LocalVectorBackend(VectorBackend):
+    """In-process store (vector_index.py): no client, no serialization, one matrix product per query."""
+    def __init__(self, path, embeddings, ivf_min_rows=VECTOR_IVF_MIN_ROWS, nprobe=VECTOR_IVF_NPROBE,
+                 quantization=VECTOR_QUANTIZATION, rescore=VECTOR_RESCORE_FACTOR):
+        self.embeddings = embeddings
+        quantization = None if quantization == "none" else quantization
+        self.index = VectorIndex(path, ivf_min_rows, nprobe, quantization, rescore)
+
+    def stored_hashes(self, files=None):
+        return {
+            doc_id: meta.get("content_hash")
+            for doc_id, meta in self.index.items()
+            if files is None or meta.get("file") in files
+        }
+
+    def upsert(self, ids, documents):
+        #the embedders return float32 arrays, handed to the index as they are
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        self.index.upsert(list(ids), vectors, [dict(doc.metadata) for doc in documents])
+
+    def delete(self, ids):
+        self.index.delete(ids)
+
+    def search(self, query, k, pool=VECTOR_MMR_POOL, lambda_mult=VECTOR_MMR_LAMBDA):
+        rows, scores = self.index.search(self.embeddings.embed_query(query), max(k, pool))
+        rows, scores = rows[0], scores[0]
+        #the pool's stored vectors are already normalized: no re-embedding, no second lookup
+        picked = rows[mmr(scores, self.index.vectors(rows), k, lambda_mult)]
+        #chunk texts are not kept, the retriever only needs the metadata (code is read from the source)
+        return [Document(page_content="", metadata=self.index.metadatas[row]) for row in picked]
+
+    def needs_rewrite(self):
+        return len(self.index) > 0 and self.index.quantization != self.index.target_quantization
+
+    def close(self):
+        self.index.save()
+
+
+class ChromaEmbeddings:
+    """The embedders hand back float32 arrays, langchain's Chroma wrapper wants plain lists."""
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts):
+        return np.asarray(self.embeddings.embed_documents(texts)).tolist()
+
+    def embed_query(self, text):
+        return list(self.embeddings.embed_query(text))
+
+
+class ChromaVectorBackend(VectorBackend):
+    """langchain's Chroma wrapper, MMR done by langchain over the embeddings Chroma returns."""
+    def __init__(self, path, embeddings):
+        #imported here, so the local backend does not need chroma installed
+        from langchain_community.vectorstores import Chroma
+        self.db = Chroma(
+            persist_directory=path,
+            embedding_function=ChromaEmbeddings(embeddings),
+            collection_name=COLLECTION_NAME
+        )
+
+    def stored_hashes(self, files=None):
+        if files is None:
+            batches = [None]
+        else:
+            files = sorted(files)
+            batches = [files[i:i + VECTOR_WRITE_BATCH] for i in range(0, len(files), VECTOR_WRITE_BATCH)]
+
+        stored = {}
+        for batch in batches:
+            where = {"file": {"$in": batch}} if batch is not None else None
+            found = self.db.get(where=where, include=["metadatas"])
+            for doc_id, meta in zip(found["ids"], found["metadatas"]):
+                #documents written before stable ids have no hash and are always replaced
+                stored[doc_id] = (meta or {}).get("content_hash")
+        return stored
+
+    def upsert(self, ids, documents):
+        #ids that already exist are overwritten in place
+        self.db.add_documents(list(documents), ids=list(ids))
+
+    def delete(self, ids):
+        self.db.delete(ids=list(ids))
+
+    def search(self, query, k, pool=VECTOR_MMR_POOL, lambda_mult=VECTOR_MMR_LAMBDA):
+        return self.db.max_marginal_relevance_search(query, k=k, fetch_k=max(k, pool), lambda_mult=lambda_mult)
+
+    def close(self):
+        #new Chroma versions persist automatically
+        self.db = None
+
+
+BACKENDS = {
+    "local": LocalVectorBackend,
+    "chroma": ChromaVectorBackend,
+}
+
+
+def open_vector_backend(path, embeddings, backend=VECTOR_BACKEND):
+    """The configured backend over the store at path (created on first write)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown VECTOR_BACKEND {backend!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend](path, embeddings)
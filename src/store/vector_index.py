@@ -0,0 +1,417 @@
+import os
+import pickle
+import uuid
+import numpy as np
+
+# In-process vector index, the store behind VECTOR_BACKEND = "local" (vector_backend.py).
+# One directory:
+#   vectors.<gen>.f32   row-major float32 matrix, L2-normalized rows (cosine = dot product)
+#   codes.<gen>.<type>  the same rows quantized (optional, see below)
+#   meta.pkl            vector file name, dim, row count, id / metadata / live flag per row,
+#                       int8 scales and the IVF lists (below). Replaced atomically by save().
+#
+# Rows are append-only: upserting an id appends a new row and marks its old one dead,
+# deleting only clears the live flag. A reader maps the rows its meta.pkl counted, so a
+# writer appending behind it never changes what it sees. When dead rows pass
+# COMPACT_DEAD_RATIO, save() writes the live rows to a new vectors.<gen>.f32 instead
+# (readers holding the old one keep their mapping).
+#
+# Search is exact below ivf_min_rows: one matrix product over all rows, batched for
+# several queries. Above it an IVF index is kept: spherical k-means centroids
+# (about 4 * sqrt(rows) lists) and the live rows of each list (CSR). A query scores the
+# centroids, then exactly the rows of its nprobe best lists. Rows written since the last
+# save are assigned to their nearest centroid; the centroids are retrained once the live
+# rows doubled since they were trained.
+#
+# Quantization ("float16", or "int8" with one scale per row: code = round(x / scale),
+# scale = max|x| / 127) keeps a second, 2x / 4x smaller copy of the rows that the
+# search scans instead of the float32 matrix. The best k * rescore candidates by the
+# approximate score are then scored again from their float32 rows, so only those pages
+# of the full matrix are ever read. A writer opening a store quantized another way
+# rewrites the codes on save. int8 scans about as fast as float32 with a quarter of the
+# memory; numpy converts float16 slowly, it halves the memory at several times the CPU.
+
+META = "meta.pkl"
+FORMAT_VERSION = 1
+
+INITIAL_ROWS = 1024
+COMPACT_DEAD_RATIO = 0.3
+SEARCH_BLOCK_ROWS = 65536  # rows scored per matrix product, bounds the temporary score block
+CODE_BLOCK_ROWS = 4096  # quantized rows converted to float32 per product, small enough to stay in cache
+
+IVF_LISTS_PER_SQRT = 4
+IVF_TRAIN_ROWS_PER_LIST = 40
+IVF_TRAIN_ITERATIONS = 8
+
+QUANTIZED_TYPES = {"float16": np.float16, "int8": np.int8}
+CODE_SUFFIX = {"float16": "f16", "int8": "i8"}
+
+
+def normalize_rows(vectors):
+    """float32 copy with unit-length rows (zero rows stay zero)."""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def quantize(vectors, quantization):
+    """(codes, per-row scales) of normalized rows; the scales are 1 unless int8."""
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if quantization == "float16":
+        return vectors.astype(np.float16), scales
+    peak = np.abs(vectors).max(axis=1) if len(vectors) else scales
+    scales = np.where(peak > 0, peak / 127, 1).astype(np.float32)
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def mmr(relevance, vectors, k, lambda_mult):
+    """
+    Maximal marginal relevance over a candidate pool: positions of k candidates, each
+    the best lambda * relevance - (1 - lambda) * (highest similarity to one already
+    picked). vectors are the candidates' normalized rows, so one product gives every
+    pairwise similarity; each pick then only updates a running maximum.
+    """
+    k = min(k, len(relevance))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    similarity = vectors @ vectors.T
+    redundancy = np.full(len(relevance), -np.inf, dtype=np.float32)
+    available = np.ones(len(relevance), dtype=bool)
+    picked = np.empty(k, dtype=np.int64)
+    for i in range(k):
+        #the most relevant candidate always comes first, whatever lambda
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy if i else np.array(relevance)
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked[i] = best
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
+
+
+def train_centroids(vectors, lists, iterations=IVF_TRAIN_ITERATIONS, seed=0):
+    """Spherical k-means: unit centroids maximizing the summed dot product of the rows."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = assign_lists(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=lists)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.add.reduceat(vectors[order], np.minimum(starts, len(vectors) - 1), axis=0)
+        empty = counts == 0
+        #an empty list restarts from a random row
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign_lists(vectors, centroids):
+    """Nearest (largest dot product) centroid of every row."""
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS])
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+class VectorIndex:
+    """Memory-mapped normalized vectors with their ids and metadata, exact or IVF search."""
+    def __init__(self, path, ivf_min_rows, nprobe, quantization=None, rescore=4):
+        if quantization not in (None, *QUANTIZED_TYPES):
+            raise ValueError(f"Unknown quantization {quantization!r}, expected None or one of {sorted(QUANTIZED_TYPES)}")
+        self.path = path
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.rescore = rescore
+        self.target_quantization = quantization
+        self.quantization = quantization  # what the files hold, the target after the next save
+
+        self.dim = None
+        self.rows = 0
+        self.capacity = 0
+        self.vector_file = None
+        self.matrix = None
+        self.codes = None
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.ids = []
+        self.metadatas = []
+        self.live = np.zeros(0, dtype=bool)
+        self.row_of = {}
+
+        self.centroids = None
+        self.trained_rows = 0
+        self.assign = np.zeros(0, dtype=np.int32)  # row -> IVF list, -1 until assigned
+        self.list_indptr = None
+        self.list_rows = None
+        self.load()
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def load(self):
+        meta_path = os.path.join(self.path, META)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "rb") as f:
+            meta = pickle.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{self.path} is an old vector index, rebuild it (v{FORMAT_VERSION})")
+
+        self.dim = meta["dim"]
+        self.rows = meta["rows"]
+        self.vector_file = meta["vector_file"]
+        self.capacity = os.path.getsize(self._vector_path(self.vector_file)) // (self.dim * 4)
+        self.ids = meta["ids"]
+        self.metadatas = meta["metadatas"]
+        self.live = meta["live"]
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids) if self.live[row]}
+        self.centroids = meta["centroids"]
+        self.trained_rows = meta["trained_rows"]
+        self.assign = meta["assign"]
+        self.list_indptr = meta["list_indptr"]
+        self.list_rows = meta["list_rows"]
+        self.quantization = meta.get("quantization")
+        self.scales = meta.get("scales", np.ones(self.rows, dtype=np.float32))
+        if self.rows:
+            #plain ndarray views, the files only grow behind the rows counted here
+            self.matrix = np.asarray(self._map(self.vector_file, np.float32, self.rows, "r"))
+            if self.quantization:
+                self.codes = np.asarray(self._map(self._codes_file(), QUANTIZED_TYPES[self.quantization], self.rows, "r"))
+
+    def _vector_path(self, name):
+        return os.path.join(self.path, name)
+
+    def _codes_file(self):
+        return f"codes.{self.vector_file.split('.')[1]}.{CODE_SUFFIX[self.quantization]}"
+
+    def _map(self, name, dtype, rows, mode):
+        """rows x dim mapping of one of the files; "r+" first extends the file to that size."""
+        if mode == "r+":
+            with open(self._vector_path(name), "ab") as f:
+                f.truncate(max(f.tell(), rows * self.dim * np.dtype(dtype).itemsize))
+        return np.memmap(self._vector_path(name), dtype=dtype, mode=mode, shape=(rows, self.dim))
+
+    def _grow(self, needed):
+        """Writable mappings of at least `needed` rows: the files are extended (doubling), never rewritten."""
+        if isinstance(self.matrix, np.memmap) and self.matrix.mode == "r+" and len(self.matrix) >= needed:
+            return
+        capacity = max(self.capacity, INITIAL_ROWS)
+        while capacity < needed:
+            capacity *= 2
+
+        os.makedirs(self.path, exist_ok=True)
+        if self.vector_file is None:
+            self.vector_file = f"vectors.{uuid.uuid4().hex[:12]}.f32"
+        self.matrix = self.codes = None
+        self.matrix = self._map(self.vector_file, np.float32, capacity, "r+")
+        if self.quantization:
+            self.codes = self._map(self._codes_file(), QUANTIZED_TYPES[self.quantization], capacity, "r+")
+        self.capacity = capacity
+
+    def upsert(self, ids, vectors, metadatas):
+        """Writes one row per id; the previous row of an id already stored is retired."""
+        vectors = normalize_rows(vectors)
+        if not len(ids):
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"vectors of dim {vectors.shape[1]} in an index of dim {self.dim}")
+
+        self.delete(ids)
+        start = self.rows
+        self._grow(start + len(ids))
+        self.matrix[start:start + len(ids)] = vectors
+        scales = np.ones(len(ids), dtype=np.float32)
+        if self.quantization:
+            self.codes[start:start + len(ids)], scales = quantize(vectors, self.quantization)
+        self.scales = np.concatenate([self.scales[:start], scales])
+        self.rows += len(ids)
+
+        self.ids.extend(ids)
+        self.metadatas.extend(metadatas)
+        self.live = np.concatenate([self.live, np.ones(len(ids), dtype=bool)])
+        self.assign = np.concatenate([self.assign, np.full(len(ids), -1, dtype=np.int32)])
+        for offset, doc_id in enumerate(ids):
+            self.row_of[doc_id] = start + offset
+
+    def delete(self, ids):
+        for doc_id in ids:
+            row = self.row_of.pop(doc_id, None)
+            if row is not None:
+                self.live[row] = False
+
+    def vectors(self, rows):
+        """The stored (normalized) vectors of rows, nothing is embedded again."""
+        return np.asarray(self.matrix[np.asarray(rows)], dtype=np.float32)
+
+    def items(self):
+        """(id, metadata) of every live row."""
+        for doc_id, row in self.row_of.items():
+            yield doc_id, self.metadatas[row]
+
+    def _compact(self):
+        """Copies the live rows to new files (quantized the target way), ids keep their order."""
+        keep = np.flatnonzero(self.live[:self.rows])
+        old_matrix = self.matrix
+
+        self.quantization = self.target_quantization
+        self.vector_file, self.matrix, self.codes, self.capacity = None, None, None, 0
+        self._grow(max(len(keep), 1))
+        self.scales = np.ones(len(keep), dtype=np.float32)
+        for start in range(0, len(keep), SEARCH_BLOCK_ROWS):
+            chunk = np.asarray(old_matrix[keep[start:start + SEARCH_BLOCK_ROWS]])
+            self.matrix[start:start + len(chunk)] = chunk
+            if self.quantization:
+                self.codes[start:start + len(chunk)], self.scales[start:start + len(chunk)] = quantize(chunk, self.quantization)
+        del old_matrix
+
+        self.rows = len(keep)
+        self.ids = [self.ids[row] for row in keep]
+        self.metadatas = [self.metadatas[row] for row in keep]
+        self.live = np.ones(len(keep), dtype=bool)
+        self.assign = self.assign[keep]
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    def _update_ivf(self):
+        """Trains, extends or drops the IVF lists for the current live rows."""
+        live_rows = len(self.row_of)
+        if live_rows < self.ivf_min_rows:
+            self.centroids, self.trained_rows, self.list_indptr, self.list_rows = None, 0, None, None
+            self.assign[:] = -1
+            return
+
+        if self.centroids is None or live_rows >= 2 * self.trained_rows:
+            lists = max(1, int(IVF_LISTS_PER_SQRT * np.sqrt(live_rows)))
+            live = np.flatnonzero(self.live[:self.rows])
+            rng = np.random.default_rng(live_rows)
+            sample = np.sort(rng.choice(live, min(len(live), lists * IVF_TRAIN_ROWS_PER_LIST), replace=False))
+            print(f"[VectorIndex] => Training {lists} IVF lists on {len(sample)} rows...")
+            self.centroids = train_centroids(np.asarray(self.matrix[sample]), lists)
+            self.trained_rows = live_rows
+            self.assign[:] = -1
+
+        todo = np.flatnonzero(self.live[:self.rows] & (self.assign[:self.rows] < 0))
+        if len(todo):
+            self.assign[todo] = assign_lists(np.asarray(self.matrix[todo]), self.centroids)
+
+        live = np.flatnonzero(self.live[:self.rows])
+        order = np.argsort(self.assign[live], kind="stable")
+        self.list_rows = live[order].astype(np.int32)
+        counts = np.bincount(self.assign[live], minlength=len(self.centroids))
+        self.list_indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def save(self):
+        """Flushes the vectors, then swaps in the new meta.pkl (what readers open)."""
+        if self.dim is None:
+            return
+        dead = self.rows - len(self.row_of)
+        if self.rows and (dead > COMPACT_DEAD_RATIO * self.rows or self.quantization != self.target_quantization):
+            self._compact()
+        self._update_ivf()
+        for mapping in (self.matrix, self.codes):
+            if isinstance(mapping, np.memmap):
+                mapping.flush()
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "dim": self.dim,
+            "rows": self.rows,
+            "vector_file": self.vector_file,
+            "ids": self.ids,
+            "metadatas": self.metadatas,
+            "live": self.live,
+            "centroids": self.centroids,
+            "trained_rows": self.trained_rows,
+            "assign": self.assign,
+            "list_indptr": self.list_indptr,
+            "list_rows": self.list_rows,
+            "quantization": self.quantization,
+            "scales": self.scales
+        }
+        tmp_path = os.path.join(self.path, META + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, os.path.join(self.path, META))
+        self._remove_retired()
+
+    def _remove_retired(self):
+        """
+        Deletes vector / code files meta.pkl no longer names. Open readers keep their mapping
+        of an unlinked file; where the OS refuses (Windows), the next save tries again.
+        """
+        current = {self.vector_file, self._codes_file() if self.quantization else None}
+        for name in os.listdir(self.path):
+            if name.startswith(("vectors.", "codes.")) and name not in current:
+                try:
+                    os.remove(self._vector_path(name))
+                except OSError:
+                    pass
+
+    def search(self, queries, k, nprobe=None):
+        """
+        (rows, scores) of the k most similar live rows for each query, best first.
+        queries: (m, dim) or (dim,); rows is a list of m int arrays. Scores are exact
+        float32 dot products, also when the candidates were found through the codes.
+        """
+        queries = normalize_rows(queries)
+        if not self.row_of or k <= 0:
+            return [np.zeros(0, dtype=np.int64)] * len(queries), [np.zeros(0, dtype=np.float32)] * len(queries)
+        candidates = k * self.rescore if self.quantization else k
+        if self.centroids is not None and self.list_rows is not None:
+            results = [self._search_ivf(q, candidates, nprobe or self.nprobe) for q in queries]
+        else:
+            results = self._search_flat(queries, candidates)
+        if self.quantization:
+            results = [self._rescore(q, rows, k) for q, (rows, _) in zip(queries, results)]
+        return [rows for rows, _ in results], [scores for _, scores in results]
+
+    def _scores(self, queries, rows):
+        """Scores of rows (a slice or sorted row numbers) for (m, dim) queries: from the codes when quantized."""
+        if not self.quantization:
+            return queries @ self.matrix[rows].T
+        return (queries @ self.codes[rows].astype(np.float32).T) * self.scales[rows]
+
+    def _search_flat(self, queries, k):
+        """Every block of rows against all queries in one product, running top k per query."""
+        best = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        block_rows = CODE_BLOCK_ROWS if self.quantization else SEARCH_BLOCK_ROWS
+        for start in range(0, self.rows, block_rows):
+            end = min(start + block_rows, self.rows)
+            scores = self._scores(queries, slice(start, end))
+            scores[:, ~self.live[start:end]] = -np.inf
+            for i, row_scores in enumerate(scores):
+                top = _top_k(row_scores, k)
+                rows = np.concatenate([best[i][0], top + start])
+                merged = np.concatenate([best[i][1], row_scores[top]])
+                keep = _top_k(merged, k)
+                best[i] = (rows[keep], merged[keep])
+        return [(rows[scores > -np.inf], scores[scores > -np.inf]) for rows, scores in best]
+
+    def _search_ivf(self, query, k, nprobe):
+        probe = _top_k(self.centroids @ query, min(nprobe, len(self.centroids)))
+        rows = np.concatenate([self.list_rows[self.list_indptr[p]:self.list_indptr[p + 1]] for p in probe])
+        rows = rows[self.live[rows]]
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows.sort()  # ascending rows read the mapping front to back
+        scores = self._scores(query[None], rows)[0]
+        top = _top_k(scores, k)
+        return rows[top].astype(np.int64), scores[top]
+
+    def _rescore(self, query, rows, k):
+        """Exact scores of the candidate rows from the float32 matrix, best k."""
+        rows = np.sort(rows)
+        scores = self.matrix[rows] @ query
+        top = _top_k(scores, k)
+        return rows[top], scores[top]
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+
+os.environ.setdefault("GROQ_API_KEY", "test")  # src.config builds the llm client at import
+from src.store.embedding_cache import EmbeddingCache
+
+
+def fake_embed(texts):
+    """A distinct, reproducible vector per text."""
+    return np.array([[sum(map(ord, t)), len(t), ord(t[0])] for t in texts], dtype=np.float32)
+
+
+def no_model(texts):
+    raise AssertionError(f"not cached: {texts}")
+
+
+def test_unsaved_eviction_keeps_saved_rows(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path), max_entries=4)
+    cache.embed_documents(["a", "b", "c", "d"], fake_embed)
+    cache.save()
+
+    #evicts a and b, then the build dies before save()
+    cache.embed_documents(["c", "d"], fake_embed)
+    cache.embed_documents(["e", "f"], fake_embed)
+    del cache
+
+    reloaded = EmbeddingCache("m", str(tmp_path), max_entries=4)
+    assert np.array_equal(reloaded.embed_documents(["a", "b", "c", "d"], no_model), fake_embed(["a", "b", "c", "d"]))
+
+
+def test_save_compacts_to_max_entries(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path), max_entries=4)
+    cache.embed_documents(["a", "b", "c", "d"], fake_embed)
+    cache.save()
+    cache.embed_documents(["e", "f", "g"], fake_embed)
+    cache.save()
+
+    assert os.path.getsize(cache.matrix_path) == 4 * 3 * 4
+    reloaded = EmbeddingCache("m", str(tmp_path), max_entries=4)
+    assert sorted(reloaded.keys.values()) == [0, 1, 2, 3]
+    assert np.array_equal(reloaded.embed_documents(["d", "e", "f", "g"], no_model), fake_embed(["d", "e", "f", "g"]))
+
+
+def test_same_miss_stored_twice(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path), max_entries=2)
+
+    def embed_racing(texts):
+        #another caller embeds and stores the same text while this one is embedding
+        cache.embed_documents(texts, fake_embed)
+        return fake_embed(texts)
+
+    cache.embed_documents(["a"], embed_racing)
+    assert cache.row_keys.count(cache.key("a")) == 1
+
+    #evicting a must not trip over a second row claiming it
+    cache.embed_documents(["b", "c", "d"], fake_embed)
+    assert len(cache.keys) == 2
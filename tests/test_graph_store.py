@@ -0,0 +1,41 @@
+import os
+
+import networkx as nx
+
+os.environ.setdefault("GROQ_API_KEY", "test")  # src.config builds the llm client at import
+import src.store.graph_store as graph_store
+from src.store.graph_registry import GraphRegistry
+from src.store.graph_store import publish_graph_store, write_graph_store
+
+
+def make_graph(*targets):
+    graph = nx.DiGraph()
+    for target in targets:
+        graph.add_edge("main", target, relation="calls")
+    return graph
+
+
+def test_rebuild_never_replaces_the_mapped_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "structure_graph.csr")
+    registry = GraphRegistry(path)
+    publish_graph_store(make_graph("a"), path)
+    first = registry.get()
+    assert list(first.successors("main")) == ["a"]
+
+    #Windows refuses to replace a mapped file
+    replaced = []
+    real_replace = os.replace
+    monkeypatch.setattr(graph_store.os, "replace", lambda src, dst: (replaced.append(dst), real_replace(src, dst)))
+    publish_graph_store(make_graph("b"), path)
+    assert first._file.name not in replaced
+
+    second = registry.get()
+    assert second is not first
+    assert list(second.successors("main")) == ["b"]
+    assert list(first.successors("main")) == ["a"]  # readers of the old generation are unaffected
+
+
+def test_store_written_before_generations_still_opens(tmp_path):
+    path = str(tmp_path / "structure_graph.csr")
+    write_graph_store(make_graph("a"), path)
+    assert list(GraphRegistry(path).get().successors("main")) == ["a"]
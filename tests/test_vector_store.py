@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("GROQ_API_KEY", "test")  # src.config builds the llm client at import
+pytest.importorskip("langchain_text_splitters")
+
+import src.store.vector as vector
+from src.store.embedding_cache import EmbeddingCache
+from src.store.vector_backend import LocalVectorBackend
+
+
+class FakeModel:
+    def embed_documents(self, texts):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0, 0.0]
+
+
+class FakeGraph:
+    def __init__(self, nodes, files):
+        self.nodes = nodes
+        self.files = files
+
+    def iter_nodes(self):
+        return iter(self.nodes)
+
+
+@pytest.fixture
+def builder(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    db_dir = tmp_path / "vector_index"
+    monkeypatch.setattr(vector, "REPO_PATH", str(repo))
+    monkeypatch.setattr(vector, "VECTOR_DB_DIR", str(db_dir))
+    monkeypatch.setattr(vector, "VECTOR_INDEX_KEYS_FILE", str(db_dir / "index_keys.json"))
+
+    builder = vector.VectorStoreBuilder.__new__(vector.VectorStoreBuilder)  # no model, no splitter
+    builder.embedding_cache = EmbeddingCache("test-model", str(tmp_path / "cache"))
+    builder.embeddings = vector.CachedEmbeddings(FakeModel(), builder.embedding_cache)
+    builder.dependency_map = {}
+    builder.open_store = lambda: LocalVectorBackend(str(db_dir), builder.embeddings)
+    return builder
+
+
+def test_repo_without_documents(builder, capsys):
+    #an empty __init__.py: a module node, but nothing to embed
+    open(os.path.join(vector.REPO_PATH, "__init__.py"), "w").close()
+    graph = FakeGraph(
+        [{"id": "__init__", "type": "module", "file": "__init__.py", "start": 1, "end": 0}],
+        {"__init__.py": "e69de29b"},
+    )
+
+    builder.index_nodes(graph)
+    assert "No documents to index!" in capsys.readouterr().out
+    assert builder.load_index_keys() == builder.index_keys(graph)
+
+    builder.index_nodes(graph)
+    assert "already up to date" in capsys.readouterr().out
+
+
+def test_cache_namespace_follows_the_kept_inference_mode(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(vector, "shared_embeddings", model)
+
+    #e.g. EMBED_INFERENCE=onnx, refused by the validation: the model runs float32
+    model.inference = "torch"
+    assert vector.VectorStoreBuilder().embedding_cache.namespace == vector.MODEL_NAME
+
+    model.inference = "onnx"
+    assert vector.VectorStoreBuilder().embedding_cache.namespace == f"{vector.MODEL_NAME}@onnx"